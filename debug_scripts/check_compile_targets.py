@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from symbolic_model import SymbolicModel
+
+
+# two layers; class weights also sit on hidden (L1) rules, which forward ignores
+HIDDEN_WEIGHTS_MODEL = {
+    "atoms": ["0_1", "0_2", "1_1", "1_2"],
+    "rules": {
+        "L1_0": {"AND": ["0_1", "1_1"]},
+        "L1_1": {"OR": ["0_2", "1_2"]},
+        "L2_0": {"OR": ["L1_0", "1_2"]},
+        "L2_1": {"AND": ["L1_1", {"NOT": "0_1"}]},
+    },
+    "linear": {
+        "weights": {
+            "class_0": {"L1_0": 5.0, "L2_0": 1.0, "L1_1": -2.5},
+            "class_1": {"L2_1": 0.75, "L1_1": 3.0, "L2_0": -0.25},
+        },
+        "bias": {"class_0": 0.0, "class_1": 0.125},
+    },
+}
+
+
+def check(sm: SymbolicModel, X: np.ndarray) -> int:
+    """Rows where forward_fused / forward_fused_active / forward_batch differ from forward."""
+    logits = sm.forward_batch(X)
+    bad = 0
+    for i, x in enumerate(X):
+        atoms = {a: bool(x[j]) for j, a in enumerate(sm.atoms)}
+        active = set(np.flatnonzero(x).tolist())
+        _, _, ref = sm.forward(atoms)
+        batch = {c: float(logits[i, k]) for k, c in enumerate(sm.classes)}
+        if not (ref == sm.forward_fused(atoms) == sm.forward_fused_active(active) == batch):
+            bad += 1
+            if bad == 1:
+                print(f"  first mismatch at row {i}: forward={ref} fused={sm.forward_fused(atoms)} "
+                      f"fused_active={sm.forward_fused_active(active)} batch={batch}")
+    return bad
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check that every compile target of SymbolicModel scores like forward."
+    )
+    parser.add_argument("--model", nargs="*", default=[], help="extra symbolic models (.json)")
+    parser.add_argument("--samples", type=int, default=2000, help="random inputs per extra model")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "hidden_weights.json"
+        path.write_text(json.dumps(HIDDEN_WEIGHTS_MODEL))
+        sm = SymbolicModel.load(path)
+        X = np.array(list(itertools.product([False, True], repeat=len(sm.atoms))))
+        bad = check(sm, X)
+        print(f"[hidden-weights] rows={len(X)} mismatches={bad}")
+        failed |= bad > 0
+
+    rng = np.random.default_rng(args.seed)
+    for model in args.model:
+        sm = SymbolicModel.load(model)
+        X = rng.random((args.samples, len(sm.atoms))) < rng.random((args.samples, 1))
+        bad = check(sm, X)
+        print(f"[{model}] rows={len(X)} mismatches={bad}")
+        failed |= bad > 0
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,6 @@ from symbolic_model import SymbolicModel
 from model_adapter import RRLAdapter
 
 
-def vec_to_atom_dict(vec: np.ndarray, atoms: list[str]) -> dict[str, bool]:
-    return {atoms[j]: bool(vec[j] == 1.0) for j in range(len(atoms))}
-
-
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--model", required=True, help="symbolic model (.json)")
@@ -28,6 +24,16 @@ def main() -> None:
     parser.add_argument(
         "--npz", help="npz dump with X,y,logits from original env (np.savez)"
     )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="optimize the rules on load (dead rules, merged duplicates); "
+             "with --npz, verify that predictions do not change",
+    )
+    parser.add_argument(
+        "--prune", type=float, default=0.0,
+        help="with --optimize, also drop weights with |w| below this",
+    )
     parser.add_argument(
         "--print-rules",
         action="store_true",
@@ -35,8 +41,15 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    sm = SymbolicModel.load(args.model)
+    sm = SymbolicModel.load(
+        args.model,
+        optimize=args.optimize,
+        prune_threshold=args.prune if args.optimize else 0.0,
+        verify_npz=args.npz if args.optimize else None,
+    )
     atoms = sm.atoms
+    if sm.optimization_report is not None:
+        print(f"[opt] {sm.optimization_report.summary()}")
 
     if args.print_rules:
         print(sm.compiled_source(module=True))
@@ -66,28 +79,20 @@ def main() -> None:
         n_classes = Y_oh.shape[1]
         print(f"[npz] N={n}, atoms={d}, classes={n_classes}")
 
-        z_sym_all = np.zeros_like(Z_repo, dtype=np.float32)
         y_true = np.argmax(Y_oh, axis=1)
         y_pred_repo = np.argmax(Z_repo, axis=1)
 
-        mismatches = 0
-        worst = (0.0, -1)
-
-        for i in range(n):
-            A = vec_to_atom_dict(X[i], atoms)
-            _, _, scores = sm.forward(A)
-            z_sym = np.array(
-                [scores.get(f"class_{c}", 0.0) for c in range(n_classes)],
-                dtype=np.float32,
-            )
-            z_sym_all[i] = z_sym
-
-            mae = float(np.max(np.abs(z_sym - Z_repo[i])))
-            if mae > worst[0]:
-                worst = (mae, i)
+        z_sym_all = np.zeros_like(Z_repo, dtype=np.float32)
+        logits = sm.forward_batch(X == 1.0)  # (N, len(sm.classes)), columns in sm.classes order
+        for j, c in enumerate(sm.classes):  # classes missing from the model keep logit 0
+            k = int(c.split("_", 1)[1])
+            if k < n_classes:
+                z_sym_all[:, k] = logits[:, j]
 
-            if int(np.argmax(z_sym)) != int(y_pred_repo[i]):
-                mismatches += 1
+        errs = np.max(np.abs(z_sym_all - Z_repo), axis=1)
+        i_max = int(np.argmax(errs)) if n else -1
+        worst = (float(errs[i_max]), i_max) if n and errs[i_max] > 0 else (0.0, -1)
+        mismatches = int(np.sum(np.argmax(z_sym_all, axis=1) != y_pred_repo))
 
         agree = 1.0 - mismatches / n
         acc_sym = float(np.mean(np.argmax(z_sym_all, axis=1) == y_true))
@@ -149,21 +154,12 @@ def main() -> None:
     Xraw = df.iloc[:, :-1].astype(int).values
     y = df.iloc[:, -1].astype(int).values
     n = len(Xraw)
-    preds = np.empty(n, dtype=int)
-    correct = 0
-
-    for i in range(n):
-        proxy_state = {
-            adapter.input_names[j]: int(Xraw[i][j])
-            for j in range(len(adapter.input_names))
-        }
-        A = adapter.encode(proxy_state)
-        _, _, scores = sm.forward(A)
-        best_label = max(scores, key=scores.get)
-        pred_idx = int(best_label.split("_", 1)[1])
-        preds[i] = pred_idx
-        if pred_idx == int(y[i]):
-            correct += 1
+
+    A_all = adapter.encode_batch(Xraw, atoms)  # (n, n_atoms) bool, model atom order
+    logits = sm.forward_batch(A_all)
+    class_ids = np.array([int(c.split("_", 1)[1]) for c in sm.classes])
+    preds = class_ids[np.argmax(logits, axis=1)] if n else np.empty(0, dtype=int)
+    correct = int(np.sum(preds == y))
 
     acc = correct / n if n else 0.0
     print(f"correct={correct} / {n}  accuracy={acc:.4f}")
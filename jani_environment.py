@@ -1,35 +1,102 @@
 # JaniEnvironment.py
 from __future__ import annotations
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, NamedTuple, Tuple, Optional, Sequence, Union
+
+import numpy as np
 
 # Import from your existing jani_parser.py (the Z3-based implementation you posted)
-from jani_parser import JANI, State, Action, Variable
+from jani_parser import JANI, State, Action, Variable, sample_index
 
 Number = float
 
+
+class _CacheEntry:
+    __slots__ = ("applicable", "successors", "status")
+
+    def __init__(self) -> None:
+        self.applicable: Optional[List[int]] = None
+        self.status: Optional[Tuple[int, Tuple[int, ...]]] = None  # JANI.status of the state
+        # action id -> per enabled edge: (destination states, cumulative probabilities)
+        self.successors: Dict[int, List[Tuple[List[State], List[float]]]] = {}
+
+
+class TransitionCache:
+    """
+    Bounded LRU memo keyed on the state value tuple: applicable actions and,
+    per action, the successor distribution of every enabled edge. Successors are
+    sampled from the cached distribution, so stochastic models stay correct.
+    """
+    def __init__(self, max_size: int) -> None:
+        if max_size <= 0:
+            raise ValueError(f"Cache size must be positive, got {max_size}")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, _CacheEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entry(self, key: tuple) -> _CacheEntry:
+        e = self._entries.get(key)
+        if e is None:
+            e = _CacheEntry()
+            self._entries[key] = e
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)  # least recently used
+        else:
+            self._entries.move_to_end(key)
+        return e
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+
+class StepResult(NamedTuple):
+    """A state with everything the episode loop needs about it."""
+    state: State
+    applicable: Tuple[int, ...]  # action ids; empty for terminal states
+    goal: bool
+    unsafe: bool
+    deadlock: bool
+
+    @property
+    def terminal(self) -> bool:
+        return self.goal or self.unsafe or self.deadlock
+
+
 @dataclass
 class JaniEnvironment:
     """
     Thin adapter around Z3-backed JANI class so runner.py can stay simple.
+    The native API works on State handles and integer action ids (positions in
+    `actions`); the dict API converts at the boundary and delegates to it.
     """
     jani: JANI
     actions: List[str]
     variables: Dict[str, Tuple[Number, Number]]  # name -> (lo, hi)
     init: Dict[str, Number]                      #  concrete initial state as name->value
+    cache_size: int = 0                          # transition cache entries (0 disables it)
+    cache: Optional[TransitionCache] = field(init=False, default=None)
+
+    def __post_init__(self) -> None:
+        if self.cache_size > 0:
+            self.cache = TransitionCache(self.cache_size)
+        # action id == position in self.actions == Action.idx
+        self._actions: List[Action] = list(self.jani._actions)
+        self.action_ids: Dict[str, int] = {label: i for i, label in enumerate(self.actions)}
 
     def _state_to_dict(self, s: State) -> Dict[str, Number]:
-        return {name: var.value for name, var in s.variable_dict.items()}
+        return s.to_dict()
 
     def _dict_to_state(self, state: Dict[str, object]) -> State:
-        ordered: List[Variable] = sorted(
-            self.jani.get_constants() + self.jani.get_variables(),
-            key=lambda v: v.idx
-        )
+        schema = self.jani.get_schema()
 
         vec: List[object] = []
-        for v in ordered:
+        for v in schema.variables:
             val = state.get(v.name, v.value)
             try:
                 val = val.item()  # works only for numpy scalar; native types have no .item()
@@ -37,46 +104,209 @@ class JaniEnvironment:
                 pass
             vec.append(val)
 
-        return State.from_vector(vec, ordered)
+        return State(schema, tuple(vec))
 
     def _sample_init(self) -> Dict[str, Number]:
-        s0 = self.jani.reset()
-        self.init = {name: var.value for name, var in s0.variable_dict.items()}
+        self.init = self.reset_state().to_dict()
         return dict(self.init)
 
-    # ---------- API used by runner.py ----------
+    # ---------- native API: State handles and integer action ids ----------
+    def reset_state(self) -> State:
+        return self.jani.reset()
+
+    def applicable_ids(self, s: State) -> List[int]:
+        """Ids of the applicable actions, ascending."""
+        if self.cache is None:
+            return [a.idx for a in self.jani.applicable_actions(s)]
+        entry = self.cache.entry(s.values())
+        if entry.applicable is None:
+            self.cache.misses += 1
+            entry.applicable = [a.idx for a in self.jani.applicable_actions(s)]
+        else:
+            self.cache.hits += 1
+        return list(entry.applicable)
+
+    def successor_states(self, s: State, a: int) -> List[State]:
+        """One sampled destination per enabled edge of action `a`."""
+        if self.cache is None:
+            return self.jani.get_successors(s, self._actions[a])
+        rng = self.jani._rng
+        return [succs[sample_index(cum_probs, rng)] for succs, cum_probs in self._distributions(s, a)]
+
+    def _distributions(self, s: State, a: int) -> List[Tuple[List[State], List[float]]]:
+        """Cached per-edge successor distributions of action id `a` in s (cache must be on)."""
+        entry = self.cache.entry(s.values())
+        dists = entry.successors.get(a)
+        if dists is None:
+            self.cache.misses += 1
+            dists = entry.successors[a] = self.jani.get_distributions(s, self._actions[a])
+        else:
+            self.cache.hits += 1
+        return dists
+
+    def _status(self, s: State) -> Tuple[int, Tuple[int, ...]]:
+        if self.cache is None:
+            return self.jani.status(s)
+        entry = self.cache.entry(s.values())
+        if entry.status is None:
+            self.cache.misses += 1
+            entry.status = self.jani.status(s)
+        else:
+            self.cache.hits += 1
+        return entry.status
+
+    def observe(self, s: State) -> StepResult:
+        """Goal, unsafe and deadlock status and applicable actions of s, from one fused evaluation."""
+        status, applicable = self._status(s)
+        return StepResult(s, applicable, status == JANI.GOAL, status == JANI.UNSAFE, status == JANI.DEADLOCK)
+
+    def step(self, s: State, a: int) -> StepResult:
+        """
+        Take action id `a` in s: sample one successor (an enabled edge uniformly, then a
+        destination by probability) and observe it.
+        """
+        if self.cache is None:
+            s2, status, applicable = self.jani.step(s, a)
+            return StepResult(s2, applicable, status == JANI.GOAL, status == JANI.UNSAFE, status == JANI.DEADLOCK)
+        rng = self.jani._rng
+        dists = self._distributions(s, a)
+        if not dists:
+            raise ValueError(f"Action {self.actions[a]} is not applicable.")
+        succs, cum_probs = dists[0] if len(dists) == 1 else dists[int(rng.integers(len(dists)))]
+        return self.observe(succs[sample_index(cum_probs, rng)])
+
+    def state_in_goal(self, s: State) -> bool:
+        return self.jani.goal_reached(s)
+
+    def state_is_unsafe(self, s: State) -> bool:
+        return self.jani.failure_reached(s)
+
+    # ---------- dict API (wraps the native one) ----------
     def applicable_actions(self, state: Dict[str, Number]) -> List[str]:
-        s = self._dict_to_state(state)
-        enabled: List[str] = []
-        for name in self.actions:
-            a = self._get_action_by_name(name)
-            # If any edge for this action is enabled, the action is applicable
-            edges = self.jani.get_edges_for_action(a.idx)
-            if any(edge.is_enabled(s) for edge in edges):
-                enabled.append(name)
-        return enabled
+        return [self.actions[i] for i in self.applicable_ids(self._dict_to_state(state))]
 
     def successors(self, state: Dict[str, Number], label: str) -> List[Dict[str, Number]]:
-        s = self._dict_to_state(state)
-        a = self._get_action_by_name(label)
-        succ_states = self.jani.get_successors(s, a)  # returns List[State]
+        succ_states = self.successor_states(self._dict_to_state(state), self.action_id(label))
         return [self._state_to_dict(ns) for ns in succ_states]
 
     def in_goal(self, state: Dict[str, Number]) -> bool:
-        s = self._dict_to_state(state)
-        return self.jani.goal_reached(s)
+        return self.state_in_goal(self._dict_to_state(state))
 
     def is_unsafe(self, state: Dict[str, Number]) -> bool:
-        s = self._dict_to_state(state)
-        return self.jani.failure_reached(s)
+        return self.state_is_unsafe(self._dict_to_state(state))
+
+    # ---------- batch API: rows are State.values() vectors (non-constant variables) ----------
+    def to_matrix(self, states: Sequence[Dict[str, Number]]) -> np.ndarray:
+        return self.jani.to_matrix([self._dict_to_state(st) for st in states])
+
+    def _as_matrix(self, states: Union[np.ndarray, Sequence[Dict[str, Number]]]) -> np.ndarray:
+        return states if isinstance(states, np.ndarray) else self.to_matrix(states)
+
+    def applicable_actions_batch(self, states: Union[np.ndarray, Sequence[Dict[str, Number]]]) -> np.ndarray:
+        """Bool mask (N, len(self.actions)) of applicable actions for every state."""
+        return self.jani.applicable_batch(self._as_matrix(states))
+
+    def in_goal_batch(self, states: Union[np.ndarray, Sequence[Dict[str, Number]]]) -> np.ndarray:
+        return self.jani.goal_reached_batch(self._as_matrix(states))
+
+    def is_unsafe_batch(self, states: Union[np.ndarray, Sequence[Dict[str, Number]]]) -> np.ndarray:
+        return self.jani.failure_reached_batch(self._as_matrix(states))
 
     # ---------- utilities ----------
-    def _get_action_by_name(self, label: str) -> Action:
-        # Action has .label (sometimes .name)
-        for a in self.jani._actions:
-            if getattr(a, "label", None) == label or getattr(a, "name", None) == label:
-                return a
-        raise KeyError(f"Unknown action label: {label}")
+    def action_id(self, label: str) -> int:
+        try:
+            return self.action_ids[label]
+        except KeyError:
+            raise KeyError(f"Unknown action label: {label}") from None
+
+
+@dataclass
+class VecStep:
+    """Outcome of one VecJaniEnvironment.step; masks are (B,) and refer to the stepped states."""
+    states: np.ndarray         # (B, n_vars) current states, finished rows already reset
+    final_states: np.ndarray   # (B, n_vars) states reached by this step (before any reset)
+    goal: np.ndarray
+    unsafe: np.ndarray
+    deadlock: np.ndarray       # no applicable action (the runner reports it as timeout)
+    truncated: np.ndarray      # max_steps actions taken without reaching a terminal state
+    done: np.ndarray
+    lengths: np.ndarray        # actions taken in the episode (meaningful where done)
+
+
+class VecJaniEnvironment:
+    """
+    B episodes of one JANI model in lockstep, held as a (B, n_vars) state matrix (columns
+    by schema position, constants excluded). Episodes follow runner.evaluate_episode:
+    goal is checked before unsafe, a state without applicable action ends the episode, and
+    an episode is cut off after max_steps actions. Finished rows are reset from the start
+    states automatically.
+    """
+    def __init__(self, jani: JANI, num_envs: int, max_steps: int = 100, seed: Optional[int] = None):
+        self.jani = jani
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.actions: List[str] = [a.label for a in jani._actions]
+        self.rng = np.random.default_rng(seed)
+        self.states: np.ndarray = np.empty((0, len(jani.get_schema())))
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self._mask = np.zeros((num_envs, len(self.actions)), dtype=bool)
+        self._stuck = np.zeros(num_envs, dtype=bool)  # start states that are goal, unsafe or deadlocked
+
+    def _start_rows(self, n: int) -> np.ndarray:
+        pool = self.jani.start_pool()
+        if pool is not None:
+            return pool[self.rng.integers(pool.shape[0], size=n)]
+        return self.jani.to_matrix([self.jani.reset() for _ in range(n)])
+
+    def _refresh(self, rows: np.ndarray) -> None:
+        X = self.states[rows]
+        self._mask[rows] = self.jani.applicable_batch(X)
+        self._stuck[rows] = (self.jani.goal_reached_batch(X) | self.jani.failure_reached_batch(X)
+                             | ~self._mask[rows].any(axis=1))
+
+    def reset(self) -> np.ndarray:
+        self.states = self._start_rows(self.num_envs)
+        self.steps[:] = 0
+        self._refresh(np.arange(self.num_envs))
+        return self.states
+
+    def action_mask(self) -> np.ndarray:
+        """(B, n_actions) applicability of every action in the current states."""
+        return self._mask
+
+    def state(self, i: int) -> State:
+        """Episode i's current state as a State (e.g. for per-state policies)."""
+        schema = self.jani.get_schema()
+        return State(schema, schema.cast(self.states[i].tolist()))
+
+    def step(self, actions: np.ndarray) -> VecStep:
+        """
+        Apply one action id per episode. Rows whose start state is already terminal or has no
+        applicable action are not stepped (their action is ignored) and finish with length 0.
+        """
+        live = np.flatnonzero(~self._stuck)
+        Y = self.states.copy()
+        if live.size:
+            Y[live] = self.jani.successors_batch(self.states[live], np.asarray(actions)[live], self.rng)
+        self.steps[live] += 1
+
+        goal = self.jani.goal_reached_batch(Y)
+        unsafe = ~goal & self.jani.failure_reached_batch(Y)
+        truncated = self.steps >= self.max_steps
+        goal = goal & ~truncated  # the runner does not check the state after the last allowed action
+        unsafe = unsafe & ~truncated
+        self.states = Y.copy()
+        self._refresh(np.arange(self.num_envs))
+        deadlock = ~goal & ~unsafe & ~truncated & ~self._mask.any(axis=1)
+        done = goal | unsafe | deadlock | truncated
+        lengths = self.steps.copy()
+
+        finished = np.flatnonzero(done)
+        if finished.size:
+            self.states[finished] = self._start_rows(finished.size)
+            self.steps[finished] = 0
+            self._refresh(finished)
+        return VecStep(self.states, Y, goal, unsafe, deadlock, truncated, done, lengths)
 
 
 def load_env(
@@ -85,17 +315,26 @@ def load_env(
     *, # TODO: add options to ignore property file and use goal/failure/init files separately
     random_init: bool = False,
     seed: Optional[int] = None,
+    cache_size: int = 0,
+    use_model_cache: bool = False,
+    model_cache_dir: Optional[str | Path] = None,
+    start_pool_size: int = 0,
+    start_pool_workers: Optional[int] = None,
 ) -> JaniEnvironment:
-    j = JANI(
+    j = JANI.load(
         model_file=str(environment_path),
         property_file=str(property_path),
         random_init=random_init,
         seed=seed,
+        cache_dir=model_cache_dir,
+        use_cache=use_model_cache,
+        start_pool_size=start_pool_size,
+        start_pool_workers=start_pool_workers,
     )
 
     # concrete initial state sampled/generated by JANI (fixed or constraint-based)
     s0 = j.reset()
-    init_dict = {name: var.value for name, var in s0.variable_dict.items()}
+    init_dict = s0.to_dict()
 
     # action names (use .label if present)
     action_names = [
@@ -120,4 +359,5 @@ def load_env(
         actions=action_names,
         variables=bounds,
         init=init_dict,
+        cache_size=cache_size,
     )
@@ -1,13 +1,23 @@
 from __future__ import annotations
+import os
+import sys
 import json
 import copy
+import pickle
+import hashlib
+import shutil
+import tempfile
+import bisect
+import operator
 import numpy as np
 
 from abc import ABC, abstractmethod
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from collections import defaultdict
-from typing import Any, Union, Optional
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Union, Optional
 from z3 import *
 
 
@@ -35,19 +45,23 @@ class Variable:
         return hash(self.name)
 
     def random(self, rng: Optional[np.random.Generator] = None) -> None:
+        self.value = self.sample(rng)
+
+    def sample(self, rng: Optional[np.random.Generator] = None) -> Union[int, float, bool]:
+        """Draw a uniform value from the variable's domain (does not modify the variable)."""
         if rng is None:
             rng = np.random.default_rng()
         
         if self.type == 'int':
             assert self.lower_bound is not None and self.upper_bound is not None
             assert isinstance(self.lower_bound, int) and isinstance(self.upper_bound, int)
-            self.value = rng.integers(self.lower_bound, self.upper_bound + 1)
+            return int(rng.integers(self.lower_bound, self.upper_bound + 1))
         elif self.type == 'real':
             assert self.lower_bound is not None and self.upper_bound is not None
             assert isinstance(self.lower_bound, float) and isinstance(self.upper_bound, float)
-            self.value = rng.uniform(self.lower_bound, self.upper_bound)
+            return float(rng.uniform(self.lower_bound, self.upper_bound))
         elif self.type == 'bool':
-            self.value = rng.choice([True, False])
+            return bool(rng.choice([True, False]))
         else:
             raise ValueError(f'Unsupported variable type: {self.type}')
 
@@ -55,52 +69,103 @@ class Variable:
 # Constant is a special type of variable
 Constant = Variable
 
-@dataclass
+
+class StateSchema:
+    '''
+    Variable layout shared by all states of a model. Constants are folded into the
+    expressions at load time, so they are kept here by name only; state positions
+    cover the non-constant variables, in idx order.
+    '''
+    __slots__ = ('all_variables', 'variables', 'names', 'index', 'constants')
+
+    def __init__(self, variables: list[Variable]):
+        variables = sorted(variables, key=lambda v: v.idx)
+        for pos, variable in enumerate(variables):
+            if variable.idx != pos:
+                raise ValueError(f"Variable {variable.name} has idx {variable.idx}, expected {pos} (indices must be 0..n-1)")
+        self.all_variables: tuple[Variable, ...] = tuple(variables)
+        self.variables: tuple[Variable, ...] = tuple(v for v in variables if not v.constant)
+        self.names: tuple[str, ...] = tuple(v.name for v in self.variables)
+        self.index: dict[str, int] = {name: pos for pos, name in enumerate(self.names)}
+        self.constants: dict[str, Union[int, float, bool]] = {v.name: v.value for v in variables if v.constant}
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def cast(self, row: list) -> tuple:
+        '''Convert a numeric row (e.g. from a matrix) back to typed state values.'''
+        casts = {'int': int, 'real': float, 'bool': bool}
+        return tuple(casts[v.type](value) for v, value in zip(self.variables, row))
+
+
 class State:
-    variable_dict: dict[str, Variable]
+    '''Immutable state: a shared schema plus a flat tuple of the non-constant variable values.'''
+    __slots__ = ('schema', '_values')
 
-    def __getitem__(self, key: str) -> Variable:
-        return self.variable_dict[key]
-    
-    def __setitem__(self, key: str, value: Any) -> None:
-        self.variable_dict[key].value = value
+    def __init__(self, schema: StateSchema, values: tuple):
+        self.schema = schema
+        self._values = values
+
+    def __getitem__(self, key: str) -> Union[int, float, bool]:
+        pos = self.schema.index.get(key)
+        if pos is None:
+            return self.schema.constants[key]
+        return self._values[pos]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.schema.index or key in self.schema.constants
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, State):
+            return NotImplemented
+        return self._values == other._values and self.schema.names == other.schema.names
 
     def __repr__(self) -> str:
-        state_values = [""] * len(self.variable_dict)
-        for variable in self.variable_dict.values():
-            state_values[variable.idx] = f"{variable.name}={variable.value}"
-        return ",".join(state_values)
+        return ",".join(f"{v.name}={value}" for v, value in zip(self.schema.all_variables, self.to_vector()))
     
     def __hash__(self) -> int:
-        return hash(self.__repr__())
+        return hash(self._values)
+
+    def __copy__(self) -> State:
+        return self
+
+    def __deepcopy__(self, memo: dict) -> State:
+        # values are immutable and the schema is shared
+        return self
+
+    @property
+    def variable_dict(self) -> dict[str, Variable]:
+        '''Materialize name -> Variable copies holding this state's values (for inspection).'''
+        out = {}
+        for variable, value in zip(self.schema.all_variables, self.to_vector()):
+            variable_copy = copy.copy(variable)
+            variable_copy.value = value
+            out[variable.name] = variable_copy
+        return out
 
     def to_vector(self) -> list[float]:
-        '''Convert the state to a vector, according to the idx.'''
-        vec = [0.0] * len(self.variable_dict)
-        for variable in self.variable_dict.values():
-            vec[variable.idx] = variable.value
-        return vec
-    
+        '''Convert the state to a vector, according to the idx (constants included).'''
+        return [self[v.name] for v in self.schema.all_variables]
+
+    def values(self) -> tuple:
+        '''Values of the non-constant variables by schema position, as used by the compiled expressions.'''
+        return self._values
+
+    def to_dict(self) -> dict[str, Any]:
+        '''name -> value for constants and variables, in idx order.'''
+        return {v.name: self[v.name] for v in self.schema.all_variables}
+
     def variable_info(self) -> str:
         '''Return a string representation of the non-constant variables in the state.'''
-        pairs = []
-        for variable in self.variable_dict.values():
-            if not variable.constant:
-                pairs.append(f"{variable.name} = {variable.value}")
-        return ", ".join(pairs)
+        return ", ".join(f"{name} = {value}" for name, value in zip(self.schema.names, self._values))
 
     @staticmethod
-    def from_vector(vec: list[float], variable_list: list[Variable]) -> State:
-        '''Create a state from a vector and a list of variables.'''
-        if len(vec) != len(variable_list):
-            raise ValueError(f"Vector length {len(vec)} does not match number of variables {len(variable_list)}")
-        variable_dict = {}
-        for idx, variable in enumerate(variable_list):
-            assert idx == variable.idx, f"Variable index {variable.idx} does not match position {idx} in the list"
-            variable_copy = copy.deepcopy(variable)
-            variable_copy.value = vec[idx]
-            variable_dict[variable.name] = variable_copy
-        return State(variable_dict)
+    def from_vector(vec: list[float], variable_list: Union[StateSchema, list[Variable]]) -> State:
+        '''Create a state from a vector by idx (the inverse of to_vector) and a schema or variable list.'''
+        schema = variable_list if isinstance(variable_list, StateSchema) else StateSchema(variable_list)
+        if len(vec) != len(schema.all_variables):
+            raise ValueError(f"Vector length {len(vec)} does not match number of variables {len(schema.all_variables)}")
+        return State(schema, tuple(vec[v.idx] for v in schema.variables))
 
 
 # class Expression(ABC):
@@ -140,6 +205,49 @@ class Expression(ABC):
     def evaluate(self, state: State) -> Any:
         pass
 
+    @abstractmethod
+    def to_py(self, index: dict[str, int]) -> str:
+        """Emit Python source evaluating the expression over a positional state vector `v`."""
+        pass
+
+    @abstractmethod
+    def to_np(self, index: dict[str, int]) -> str:
+        """Emit NumPy source evaluating the expression row-wise over a state matrix `X` (N, n_vars)."""
+        pass
+
+    def children(self) -> list[Expression]:
+        return [getattr(self, attr) for attr in ('left', 'right', 'arg') if hasattr(self, attr)]
+
+    def fold(self, constants: dict[str, Any]) -> Expression:
+        """Substitute constants and fold constant subterms, `true ∧ x`, `false ∨ x` and friends."""
+        if isinstance(self, VarExpression):
+            return ConstantExpression(constants[self.variable]) if self.variable in constants else self
+        if isinstance(self, ConstantExpression):
+            return self
+        children = [child.fold(constants) for child in self.children()]
+        folded = type(self)(*children)
+        if all(isinstance(child, ConstantExpression) for child in children):
+            try:
+                return ConstantExpression(folded.evaluate(None))
+            except ZeroDivisionError:
+                return folded  # keep the runtime error where it would have happened
+        if isinstance(self, (ConjExpression, DisjExpression)):
+            left, right = children
+            absorbing = isinstance(self, DisjExpression)  # true ∨ x = true, false ∧ x = false
+            for const, other in ((left, right), (right, left)):
+                if isinstance(const, ConstantExpression):
+                    return const if bool(const.value) == absorbing else other
+        return folded
+
+    def variables(self) -> set[str]:
+        """Names of all variables (and constants) the expression reads."""
+        if isinstance(self, VarExpression):
+            return {self.variable}
+        names: set[str] = set()
+        for child in self.children():
+            names |= child.variables()
+        return names
+
     @staticmethod
     def _norm_op(op: str) -> str:
         # Map ASCII spellings to a canonical symbol so the switch is small
@@ -205,8 +313,14 @@ class VarExpression(Expression):
         return self.variable
 
     def evaluate(self, state: State) -> float:
-        return state[self.variable].value
+        return state[self.variable]
     
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"v[{index[self.variable]}]"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"X[:, {index[self.variable]}]"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         '''Convert the variable expression to a Z3 clause.'''
         variable = ctx.get_variable(self.variable)
@@ -245,6 +359,12 @@ class ConstantExpression(Expression):
     def evaluate(self, state: State) -> Union[int, float, bool]:
         return self.value
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return repr(self.value)
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return repr(self.value)
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         return self.value, [], []
 
@@ -260,6 +380,12 @@ class AddExpression(Expression):
     def evaluate(self, state: State) -> float:
         return self.left.evaluate(state) + self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} + {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} + {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -277,6 +403,12 @@ class SubExpression(Expression):
     def evaluate(self, state: State) -> float:
         return self.left.evaluate(state) - self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} - {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} - {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -294,6 +426,12 @@ class MulExpression(Expression):
     def evaluate(self, state: State) -> float:
         return self.left.evaluate(state) * self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} * {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} * {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -311,6 +449,12 @@ class DivExpression(Expression):
     def evaluate(self, state: State) -> float:
         return self.left.evaluate(state) / self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} / {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} / {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -327,6 +471,12 @@ class ConjExpression(Expression):
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) and self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} and {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} & {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -344,6 +494,12 @@ class DisjExpression(Expression):
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) or self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} or {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} | {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -361,6 +517,12 @@ class EqExpression(Expression):
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) == self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} == {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} == {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -378,6 +540,12 @@ class LeExpression(Expression):
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) <= self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} <= {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} <= {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -395,6 +563,12 @@ class LtExpression(Expression):
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) < self.right.evaluate(state)
 
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} < {self.right.to_py(index)})"
+
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} < {self.right.to_np(index)})"
+
     def to_clause(self, ctx: JANI) -> tuple[ExprRef, list[ExprRef], list[ExprRef]]:
         left, left_addt, left_vars = self.left.to_clause(ctx)
         right, right_addt, right_vars = self.right.to_clause(ctx)
@@ -407,6 +581,10 @@ class NeExpression(Expression):
     def __repr__(self): return f"({self.left.__repr__()} ≠ {self.right.__repr__()})"
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) != self.right.evaluate(state)
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} != {self.right.to_py(index)})"
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} != {self.right.to_np(index)})"
     def to_clause(self, ctx: "JANI"):
         left, la, lv = self.left.to_clause(ctx)
         right, ra, rv = self.right.to_clause(ctx)
@@ -418,6 +596,10 @@ class GeExpression(Expression):
     def __repr__(self): return f"({self.left.__repr__()} ≥ {self.right.__repr__()})"
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) >= self.right.evaluate(state)
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} >= {self.right.to_py(index)})"
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} >= {self.right.to_np(index)})"
     def to_clause(self, ctx: "JANI"):
         left, la, lv = self.left.to_clause(ctx)
         right, ra, rv = self.right.to_clause(ctx)
@@ -429,6 +611,10 @@ class GtExpression(Expression):
     def __repr__(self): return f"({self.left.__repr__()} > {self.right.__repr__()})"
     def evaluate(self, state: State) -> bool:
         return self.left.evaluate(state) > self.right.evaluate(state)
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_py(index)} > {self.right.to_py(index)})"
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"({self.left.to_np(index)} > {self.right.to_np(index)})"
     def to_clause(self, ctx: "JANI"):
         left, la, lv = self.left.to_clause(ctx)
         right, ra, rv = self.right.to_clause(ctx)
@@ -440,11 +626,62 @@ class NotExpression(Expression):
     def __repr__(self): return f"(¬{self.arg.__repr__()})"
     def evaluate(self, state: State) -> bool:
         return not self.arg.evaluate(state)
+    def to_py(self, index: dict[str, int]) -> str:
+        return f"(not {self.arg.to_py(index)})"
+    def to_np(self, index: dict[str, int]) -> str:
+        return f"np.logical_not({self.arg.to_np(index)})"
     def to_clause(self, ctx: "JANI"):
         a, add, vs = self.arg.to_clause(ctx)
         return Not(a), add, vs
 
 
+# ----------------------------------------------------------------------
+# Compilation: Expression -> Python code -> functions
+# ----------------------------------------------------------------------
+def _compile_funcs_with_src(
+    bodies: dict[str, str],
+    arg: str = "v",
+) -> tuple[dict[str, Callable[[Any], Any]], dict[str, str], str]:
+    """Compile `name -> python expression over arg` into one module of functions `name(arg)`."""
+    env: dict[str, Any] = {"np": np}
+    per_func_src: dict[str, str] = {}
+    code_lines: list[str] = []
+
+    for fn_name, py_expr in bodies.items():
+        src = f"def {fn_name}({arg}):\n    return {py_expr}\n"
+        per_func_src[fn_name] = src
+        code_lines.append(src)
+
+    module_src = "\n".join(code_lines)
+    exec(module_src, env, env)
+
+    funcs = {fn_name: env[fn_name] for fn_name in bodies}
+    return funcs, per_func_src, module_src
+
+
+def sample_index(cum_probs: list[float], rng: np.random.Generator) -> int:
+    """Draw an outcome index from cumulative probabilities; single outcomes skip the RNG."""
+    if len(cum_probs) == 1:
+        return 0
+    return min(bisect.bisect_right(cum_probs, rng.random()), len(cum_probs) - 1)
+
+
+def _broadcast_rows(np_expr: str) -> str:
+    return f"np.broadcast_to({np_expr}, (X.shape[0],))"
+
+
+def _conjuncts(expr: Expression) -> list[Expression]:
+    """Top-level conjuncts of an expression, left to right."""
+    if isinstance(expr, ConjExpression):
+        return _conjuncts(expr.left) + _conjuncts(expr.right)
+    return [expr]
+
+
+def _can_raise(expr: Expression) -> bool:
+    """Whether evaluating the expression can raise (a division by zero)."""
+    return isinstance(expr, DivExpression) or any(_can_raise(child) for child in expr.children())
+
+
 @dataclass
 class Assignment:
     target: str
@@ -458,54 +695,201 @@ class Destination:
 
 
 class Edge:
-    def __init__(self, json_obj: dict):
+    def __init__(self, json_obj: dict, constants: Optional[dict[str, Any]] = None):
+        # constants are substituted and folded away at load time
+        constants = constants or {}
         self._label = json_obj['action']
-        self._guard = Expression.construct(json_obj['guard']['exp'])
+        self._guard = Expression.construct(json_obj['guard']['exp']).fold(constants)
         self._destinations = []
         for destination in json_obj['destinations']:
             assignments = []
             for assignment in destination['assignments']:
                 # Handle both 'target' and 'ref' field names for assignment target
                 target_field = assignment.get('target') or assignment.get('ref')
-                assignments.append(Assignment(target_field, Expression.construct(assignment['value'])))
+                assignments.append(Assignment(target_field, Expression.construct(assignment['value']).fold(constants)))
             if 'probability' in destination:
-                probability = destination['probability']['exp']
+                probability = Expression.construct(destination['probability']['exp']).fold(constants)
+                if not isinstance(probability, ConstantExpression):
+                    raise ValueError(f"Probability of an edge for {self._label} is not constant: {probability}")
+                probability = probability.value
             else:
                 probability = 1.0
+            if probability == 0:
+                continue  # unreachable outcome
             self._destinations.append(Destination(assignments, probability))
+        distribution = [destination.probability for destination in self._destinations]
+        # validated once here instead of on every apply (tolerate float rounding of the sum)
+        assert abs(sum(distribution) - 1.0) <= 1e-9, f"Invalid probability distribution: {distribution}"
+        self._cum_probs: list[float] = list(accumulate(distribution))
+        # set by JANI once the variable layout is known (see JANI._compile_expressions)
+        self._guard_fn: Callable[[list], bool] = None
+        self._guard_batch_fn: Callable[[np.ndarray], np.ndarray] = None
+        self._update_fns: list[Callable[[list], tuple]] = []
+        self._update_batch_fns: list[Callable[[np.ndarray], tuple]] = []
+        self._targets: list[tuple[int, ...]] = []  # assigned positions per destination
+
+    def __getstate__(self) -> dict:
+        # compiled functions are rebound by JANI after unpickling
+        state = self.__dict__.copy()
+        state.update(_guard_fn=None, _guard_batch_fn=None, _update_fns=[], _update_batch_fns=[])
+        return state
+
+    def never_enabled(self) -> bool:
+        return isinstance(self._guard, ConstantExpression) and not self._guard.value
+
+    def guard_src(self, index: dict[str, int]) -> str:
+        return self._guard.to_py(index)
+
+    def update_src(self, destination: Destination, index: dict[str, int]) -> str:
+        """All assignment values of a destination as one tuple, evaluated on the source state."""
+        values = "".join(f"{assignment.value.to_py(index)}, " for assignment in destination.assignments)
+        return f"({values})"
+
+    def update_batch_src(self, destination: Destination, index: dict[str, int]) -> str:
+        """Like update_src, over a state matrix X: one column per assignment."""
+        values = "".join(f"{_broadcast_rows(assignment.value.to_np(index))}, " for assignment in destination.assignments)
+        return f"({values})"
 
     def is_enabled(self, state: State) -> bool:
-        return self._guard.evaluate(state)
+        return self._guard_fn(state.values())
+
+    def is_enabled_batch(self, X: np.ndarray) -> np.ndarray:
+        """Guard over every row of a state matrix X (N, n_vars); returns a bool vector (N,)."""
+        return self._guard_batch_fn(X)
+
+    def _destination_state(self, state: State, d: int) -> State:
+        """Successor through destination d: copy the value vector, write only the assigned slots."""
+        vec = state.values()
+        values = list(vec)
+        for pos, value in zip(self._targets[d], self._update_fns[d](vec)):
+            values[pos] = value
+        return State(state.schema, tuple(values))
+
+    def sample(self, state: State, rng: np.random.Generator) -> State:
+        """Build only one destination, drawn from the edge distribution (the edge must be enabled)."""
+        return self._destination_state(state, sample_index(self._cum_probs, rng))
 
     def apply(self, state: State) -> tuple[list[State], list[float]]:
-        if self._guard.evaluate(state):
-            new_states = []
-            distribution = []
-            for _, destination in enumerate(self._destinations):
-                new_state = copy.deepcopy(state)
-                for assignment in destination.assignments:
-                    # print(f"Applying assignment of {idx}th outcome: {assignment.target} = {assignment.value}")
-                    new_state[assignment.target] = assignment.value.evaluate(state)
-                new_states.append(new_state)
-                distribution.append(destination.probability)
-            assert sum(distribution) == 1.0, f"Invalid probability distribution: {distribution}"
+        if self._guard_fn(state.values()):
+            new_states = [self._destination_state(state, d) for d in range(len(self._destinations))]
+            distribution = [destination.probability for destination in self._destinations]
             return (new_states, distribution)
         else:
             return ([], [])
 
 
+class GuardIndex:
+    '''
+    Dependency index over the guards of an automaton.
+    Records the variables every guard reads and turns atomic conjuncts `var op c`
+    into per-variable tables: value -> bitmask of edges whose atoms on var hold.
+    '''
+    _ATOM_OPS = {'EqExpression': '=', 'NeExpression': '≠', 'LeExpression': '≤',
+                 'LtExpression': '<', 'GeExpression': '≥', 'GtExpression': '>'}
+    _FLIP = {'=': '=', '≠': '≠', '≤': '≥', '<': '>', '≥': '≤', '>': '<'}
+    _EVAL = {'=': operator.eq, '≠': operator.ne, '≤': operator.le,
+             '<': operator.lt, '≥': operator.ge, '>': operator.gt}
+    MAX_DOMAIN = 1 << 12  # larger domains are left to the compiled guard
+
+    def __init__(self, edges: list[Edge], schema: StateSchema):
+        self.reads: list[frozenset[str]] = [frozenset(edge._guard.variables()) for edge in edges]
+        self.atoms: list[list[tuple[str, str, Any]]] = []
+        self.residual: list[bool] = []  # guard still has to be evaluated after the table lookup
+        domains = {v.name: v for v in schema.variables if self._indexable(v)}
+        for edge in edges:
+            atoms, rest = self._split_conjuncts(edge._guard)
+            indexed = [atom for atom in atoms if atom[0] in domains]
+            self.atoms.append(indexed)
+            self.residual.append(bool(rest) or len(indexed) != len(atoms))
+        self.residual_mask = sum(1 << e for e, r in enumerate(self.residual) if r)
+
+        self.all_edges = (1 << len(edges)) - 1
+        # (position, lower bound, masks by value - lb, edges with an atom on the variable)
+        self.tables: list[tuple[int, int, list[int], int]] = []
+        for name in sorted({atom[0] for atoms in self.atoms for atom in atoms}, key=schema.index.get):
+            variable = domains[name]
+            lo, hi = self._bounds(variable)
+            masks = []
+            for value in range(lo, hi + 1):
+                mask = 0
+                for e, atoms in enumerate(self.atoms):
+                    if all(self._EVAL[op](value, c) for var, op, c in atoms if var == name):
+                        mask |= 1 << e
+                masks.append(mask)
+            on_var = sum(1 << e for e, atoms in enumerate(self.atoms) if any(atom[0] == name for atom in atoms))
+            self.tables.append((schema.index[name], lo, masks, on_var))
+
+    @staticmethod
+    def _bounds(variable: Variable) -> tuple[int, int]:
+        if variable.type == 'bool':
+            return 0, 1
+        return variable.lower_bound, variable.upper_bound
+
+    @classmethod
+    def _indexable(cls, variable: Variable) -> bool:
+        if variable.constant:
+            return False
+        if variable.type == 'bool':
+            return True
+        return (variable.type == 'int' and variable.lower_bound is not None and variable.upper_bound is not None
+                and variable.upper_bound - variable.lower_bound < cls.MAX_DOMAIN)
+
+    @classmethod
+    def _split_conjuncts(cls, expr: Expression) -> tuple[list[tuple[str, str, Any]], list[Expression]]:
+        """Flatten a top-level conjunction into atoms `(var, op, const)` and the remaining conjuncts."""
+        atoms, rest = [], []
+        stack = [expr]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ConjExpression):
+                stack.extend((node.right, node.left))
+                continue
+            op = cls._ATOM_OPS.get(type(node).__name__)
+            if op is not None and isinstance(node.left, VarExpression) and isinstance(node.right, ConstantExpression):
+                atoms.append((node.left.variable, op, node.right.value))
+            elif op is not None and isinstance(node.left, ConstantExpression) and isinstance(node.right, VarExpression):
+                atoms.append((node.right.variable, cls._FLIP[op], node.left.value))
+            else:
+                rest.append(node)
+        return atoms, rest
+
+    def candidates(self, vec: tuple) -> tuple[int, int]:
+        """
+        Bitmasks (candidates, to_check) for the state vector: edges not ruled out by the
+        atom tables, and among them those whose compiled guard must still be evaluated:
+        residual guards, and guards with an atom on a variable outside its declared
+        bounds (no table entry; e.g. after an unchecked update).
+        """
+        mask = self.all_edges
+        check = self.residual_mask
+        for pos, lo, masks, on_var in self.tables:
+            off = vec[pos] - lo
+            if 0 <= off < len(masks):
+                mask &= masks[off]
+            else:
+                check |= on_var
+        return mask, check
+
+
 class Automaton:
-    def __init__(self, json_obj: dict):
+    def __init__(self, json_obj: dict, schema: StateSchema):
         def create_edge_dict() -> dict[str, list[Edge]]:
             """Create a dictionary of edges, indexed by the action label."""
             edge_dict = defaultdict(list)
-            for edge in json_obj['edges']:
-                edge_obj = Edge(edge)
+            for edge_obj in self._edge_list:
                 edge_dict[edge_obj._label].append(edge_obj)
             return edge_dict
 
         self._name: str = json_obj['name']
+        edges = [Edge(edge, schema.constants) for edge in json_obj['edges']]
+        # edges whose guard folds to false can never fire
+        self._edge_list: list[Edge] = [edge for edge in edges if not edge.never_enabled()]
+        self._dropped_edges: int = len(edges) - len(self._edge_list)
         self._edges = create_edge_dict()
+        self._guard_index = GuardIndex(self._edge_list, schema)
+        self._action_masks: dict[str, int] = defaultdict(int)
+        for e, edge in enumerate(self._edge_list):
+            self._action_masks[edge._label] |= 1 << e
         # So far, we won't use the following fields
         self._initial_locations: list[str] = json_obj['initial-locations']
         self._locations: list[dict[str, str]] = json_obj['locations']
@@ -518,17 +902,41 @@ class Automaton:
         if action.label not in self._edges:
             raise ValueError(f'Action {action.label} is not supported in automaton {self._name}.')
         new_states = []
-        for edge in self._edges[action.label]:
-            if not edge.is_enabled(state):
-                continue
-            successors, distribution = edge.apply(state)
+        for edge in self._enabled_edges(state, self._action_masks[action.label]):
             if return_all:
+                successors, _ = edge.apply(state)
                 new_states.extend(successors)
             else:
-                next_state = rng.choice(successors, p=distribution)
-                new_states.append(next_state)
+                new_states.append(edge.sample(state, rng))
         return new_states
     
+    def _enabled_edges(self, state: State, mask: int = -1) -> list[Edge]:
+        """Enabled edges among `mask`, in edge order: table lookup first, compiled guard for the rest."""
+        index = self._guard_index
+        vec = state.values()
+        candidates, check = index.candidates(vec)
+        mask &= candidates
+        enabled = []
+        while mask:
+            low = mask & -mask
+            e = low.bit_length() - 1
+            mask ^= low
+            edge = self._edge_list[e]
+            if not check & low or edge._guard_fn(vec):
+                enabled.append(edge)
+        return enabled
+
+    def distributions(self, state: State, action: Action) -> list[tuple[list[State], list[float]]]:
+        """For every enabled edge of the action: all destination states and their cumulative probabilities."""
+        if action.label not in self._edges:
+            raise ValueError(f'Action {action.label} is not supported in automaton {self._name}.')
+        return [(edge.apply(state)[0], edge._cum_probs)
+                for edge in self._enabled_edges(state, self._action_masks[action.label])]
+
+    def enabled_labels(self, state: State) -> set[str]:
+        """Labels of all actions with at least one enabled edge."""
+        return {edge._label for edge in self._enabled_edges(state)}
+
     def get_edges(self, action: Action) -> list[Edge]:
         """Get all edges for the given action."""
         if action.label not in self._edges:
@@ -536,6 +944,12 @@ class Automaton:
         return self._edges[action.label]
 
 
+def _start_pool_chunk(model: JANI, k: int, seed: int) -> np.ndarray:
+    """Worker of JANI.pregenerate_start_pool: k start states of a (pickled) model as a matrix."""
+    model._rng = np.random.default_rng(seed)
+    return model.to_matrix(model.reset_batch(k))
+
+
 class JANI:
     def __init__(self, model_file: str, start_file: str = None, goal_file: str = None, failure_file: str = None, property_file: str = None, interface_file: str = None, random_init: bool = False, seed: Optional[int] = None, block_previous: bool = True, block_all: bool = False):
         def add_action(action_info: dict, idx: int) -> Action:
@@ -655,7 +1069,9 @@ class JANI:
                 assert v.idx == interface_spec['input'][v.name], f"Variable {v.name} index mismatch."
             for a in self._actions:
                 assert a.idx == interface_spec['output'][a.name], f"Action {a.name} index mismatch."
-        self._automata: list[Automaton] = [Automaton(automaton) for automaton in jani_obj['automata']]
+        # shared layout of every state of this model (positions follow idx)
+        self._schema = StateSchema(self._constants + self._variables)
+        self._automata: list[Automaton] = [Automaton(automaton, self._schema) for automaton in jani_obj['automata']]
         if len(self._automata) > 1:
             raise ValueError('Multiple automata are not supported yet.')
         if property_file is not None:
@@ -706,12 +1122,22 @@ class JANI:
         # Initialize RNG for consistent seeding throughout the JANI instance
         self._rng = np.random.default_rng(seed)
 
+        constants = self._schema.constants
+        if hasattr(self, '_goal_expr'):
+            self._goal_expr = self._goal_expr.fold(constants)
+        if hasattr(self, '_failure_expr'):
+            self._failure_expr = self._failure_expr.fold(constants)
+        self._compile_expressions()
+
     class InitGenerator(ABC):
         '''Generate initial states.'''
         @abstractmethod
         def generate(self, rng: np.random.Generator) -> State:
             pass
 
+        def generate_batch(self, k: int, rng: np.random.Generator) -> list[State]:
+            return [self.generate(rng) for _ in range(k)]
+
     class RandomGenerator(InitGenerator):
         '''Generate initial states randomly.'''
         def __init__(self, model: JANI):
@@ -719,171 +1145,610 @@ class JANI:
 
         def generate(self, rng: np.random.Generator) -> State:
             # Implement random state generation
-            state_dict = {}
-            for constant in self._model._constants:
-                state_dict[constant.name] = copy.deepcopy(constant)
-            for _variable in self._model._variables:
-                variable = copy.deepcopy(_variable)
-                variable.random(rng)
-                state_dict[variable.name] = variable
-            return State(state_dict)
+            schema = self._model._schema
+            return State(schema, tuple(variable.sample(rng) for variable in schema.variables))
 
     class FixedGenerator(InitGenerator):
-        '''Generate a fixed set of initial states.'''
+        '''
+        Generate a fixed set of initial states. The pool is kept as an (n_starts, n_vars)
+        matrix over the schema positions; States are only built for sampled rows.
+        '''
         def __init__(self, json_obj: dict, model: JANI):
-            def create_state(state_value: list[dict]) -> State:
-                variable_dict = {variable_info['var']: variable_info['value'] for variable_info in state_value['variables']}
-                state_dict = {}
-                for constant in model._constants:
-                    state_dict[constant.name] = copy.deepcopy(constant)
-                for _variable in model._variables:
-                    variable = copy.deepcopy(_variable)
-                    if variable.name not in variable_dict:
-                        variable_dict[variable.name] = variable.value
-                    value = variable_dict[variable.name]
-                    variable.value = value
-                    state_dict[variable.name] = variable
-                return State(state_dict)
-
-            self._pool: list[State] = []
+            schema = model._schema
+            self._model = model
+
+            rows = []
             for state_value in json_obj['values']:
-                state = create_state(state_value)
-                self._pool.append(state)
-      
+                variable_dict = {variable_info['var']: variable_info['value'] for variable_info in state_value['variables']}
+                rows.append([variable_dict.get(v.name, v.value) for v in schema.variables])
+            dtype = np.float64 if any(v.type == 'real' for v in schema.variables) else np.int64
+            self._pool: np.ndarray = np.asarray(rows, dtype=dtype).reshape(len(rows), len(schema))
+
+        @classmethod
+        def from_matrix(cls, X: np.ndarray, model: JANI) -> JANI.FixedGenerator:
+            '''A fixed pool from an (n_starts, n_vars) matrix, e.g. a pre-solved start pool.'''
+            generator = cls.__new__(cls)
+            generator._model = model
+            generator._pool = X
+            return generator
+
+        def __getstate__(self) -> dict:
+            # the pool is stored next to the pickle as a matrix (see JANI.load)
+            state = self.__dict__.copy()
+            state['_pool'] = None
+            return state
+
+        def __len__(self) -> int:
+            return self._pool.shape[0]
+
+        def pool_matrix(self) -> np.ndarray:
+            return self._pool
+
+        def set_pool_matrix(self, X: np.ndarray) -> None:
+            self._pool = X
+
+        def sample(self, rng: np.random.Generator) -> tuple[int, np.ndarray]:
+            '''Draw a start state as (pool index, row) without building a State.'''
+            i = int(rng.integers(self._pool.shape[0]))
+            return i, self._pool[i]
+
+        def state(self, i: int) -> State:
+            schema = self._model._schema
+            return State(schema, schema.cast(self._pool[i].tolist()))
+
         def generate(self, rng: np.random.Generator) -> State:
-            return rng.choice(self._pool)
+            i, _ = self.sample(rng)
+            return self.state(i)
 
     class ConstraintsGenerator(InitGenerator):
-        '''Generate initial states based on constraints.'''
+        '''
+        Generate initial states based on constraints.
+
+        If the constrained variables are bounded ints/bools with at most MAX_ENUMERATION joint
+        values, all satisfying assignments are enumerated once (vectorized over the bounds)
+        and states are drawn uniformly from them; with block_all, without replacement until
+        every solution was produced once.
+
+        Otherwise one Z3 solver per generator holds the core constraints; per-call diversity
+        constraints live in a push/pop scope, and the block_all clauses are added once,
+        guarded by an assumption literal.
+        '''
+        _BLOCK_LITERAL = '__microplaja_block_previous'
+        MAX_ENUMERATION = 1 << 22
+        _ENUMERATION_CHUNK = 1 << 16
+
         def __init__(self, json_obj: dict, model: JANI, block_previous: bool = True, block_all: bool = False):
             self._model = model
-            constraint_expr = json_obj['exp']
-            expr = Expression.construct(constraint_expr)
+            self._constraint_expr = Expression.construct(json_obj['exp'])
             self._block_previous = block_previous
             self._block_all = block_all
-            self._main_clause, self._additional_clauses, self._all_vars = expr.to_clause(self._model)
+            self._solver = None
+            self._enumerate_solutions()
+            if self._solutions is None:
+                self._build_solver()
+
+        def _enumerate_solutions(self) -> None:
+            '''
+            Set `_solutions` to the (n_solutions, n_constrained) matrix of satisfying assignments
+            of the constrained variables (`_solution_vars`), or to None if the domain is not
+            small, bounded and discrete.
+            '''
+            self._solutions = None
+            schema = self._model._schema
+            expr = self._constraint_expr.fold(schema.constants)
+            names = expr.variables()
+            if not names <= set(schema.index):
+                return
+            variables = sorted((schema.variables[schema.index[name]] for name in names), key=lambda v: v.idx)
+            lows, sizes = [], []
+            for v in variables:
+                if v.type == 'bool':
+                    lows.append(0)
+                    sizes.append(2)
+                elif v.type == 'int' and v.lower_bound is not None and v.upper_bound is not None:
+                    lows.append(v.lower_bound)
+                    sizes.append(v.upper_bound - v.lower_bound + 1)
+                else:
+                    return
+            total = 1
+            for size in sizes:
+                total *= size
+            if total > self.MAX_ENUMERATION:
+                return
+            body = _broadcast_rows(expr.to_np({v.name: col for col, v in enumerate(variables)}))
+            funcs, _, _ = _compile_funcs_with_src({"_start_condition": body}, arg="X")
+            condition = funcs["_start_condition"]
+
+            # decode flat indices of the joint domain (last variable fastest) chunk by chunk
+            lows = np.asarray(lows, dtype=np.int64)
+            sizes = np.asarray(sizes, dtype=np.int64)
+            strides = np.ones_like(sizes)
+            strides[:-1] = np.cumprod(sizes[::-1])[:-1][::-1]
+            chunks = []
+            for start in range(0, total, self._ENUMERATION_CHUNK):
+                flat = np.arange(start, min(start + self._ENUMERATION_CHUNK, total), dtype=np.int64)
+                X = lows + (flat[:, None] // strides) % sizes
+                # the condition is evaluated eagerly: a guarded x / y still divides where y == 0
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    chunks.append(X[condition(X)])
+            self._solution_vars = variables
+            self._solutions = np.concatenate(chunks)
+            self._unused = np.empty(0, dtype=np.int64)  # block_all: solutions left in this round
+
+        def _solution_state(self, i: int, rng: np.random.Generator) -> State:
+            casts = {'int': int, 'bool': bool}
+            row = self._solutions[i].tolist()
+            target_vars = {v.name: casts[v.type](value) for v, value in zip(self._solution_vars, row)}
+            return self._create_state(target_vars, rng)
+
+        def _draw_solutions(self, k: int, rng: np.random.Generator) -> np.ndarray:
+            '''Indices of up to k distinct solutions, uniformly at random.'''
+            n = self._solutions.shape[0]
+            if not (self._block_previous and self._block_all):
+                return rng.choice(n, size=min(k, n), replace=False)
+            if self._unused.size == 0:
+                self._unused = rng.permutation(n)
+            drawn, self._unused = self._unused[:k], self._unused[k:]
+            return drawn
+
+        def _build_solver(self) -> None:
+            self._main_clause, self._additional_clauses, all_vars = self._constraint_expr.to_clause(self._model)
+            self._all_vars = list({str(v): v for v in all_vars}.values())
+            self._solver = Tactic('qflra').solver()
+            self._solver.set('smt.arith.random_initial_value', True)
+            self._solver.add(self._main_clause)
+            for clause in self._additional_clauses:
+                self._solver.add(clause)
+            self._block_literal = Bool(self._BLOCK_LITERAL)
             self._cached_values = defaultdict(set) # cache previously generated values for each variable
-            self._cached_models = list() # cache previously generated models
 
-        def generate(self, rng: np.random.Generator) -> State:
-            # Implement constraint-based state generation
-            def z3_value_to_python(z3_value: z3.ExprRef) -> Any:
-                if z3_value.sort().kind() == z3.Z3_INT_SORT:
-                    python_value = z3_value.as_long()
-                elif z3_value.sort().kind() == z3.Z3_REAL_SORT:
-                    python_value = float(z3_value.as_decimal(10).replace('?', ''))
-                elif z3_value.sort().kind() == z3.Z3_BOOL_SORT:
-                    python_value = is_true(z3_value)
-                else:
-                    raise ValueError(f"Unsupported Z3 value type: {z3_value.sort().kind()}")
-                return python_value
-
-            def solver_with_core_constraints() -> z3.Solver:
-                s = Tactic('qflra').solver()
-                s.set('smt.random_seed', int(rng.integers(0, 2**31)))
-                s.set('smt.arith.random_initial_value', True)
-                s.add(self._main_clause)
-                for clause in self._additional_clauses:
-                    s.add(clause)
-                return s
-            
-            def block_random_variable() -> list:
-                v = rng.choice(self._all_vars)
-                return [v != value for value in self._cached_values[str(v)]]
-            
-            def block_all_previous() -> list:
-                criteria = []
-                for model in self._cached_models:
-                    criteria.append(Or([v != model[v] for v in self._all_vars]))
-                return criteria
-            
-            def cache_current_values(model: z3.Model) -> None:
-                for v in model.decls():
-                    z3_value = model[v]
-                    python_value = z3_value_to_python(z3_value)
-                    self._cached_values[v.name()].add(python_value)
+        def __getstate__(self) -> dict:
+            # Z3 objects cannot be pickled; the solver is rebuilt on first use
+            state = self.__dict__.copy()
+            for attr in ('_main_clause', '_additional_clauses', '_all_vars', '_solver', '_block_literal', '_cached_values'):
+                state[attr] = None
+            return state
+
+        @staticmethod
+        def _z3_value_to_python(z3_value: z3.ExprRef) -> Any:
+            if z3_value.sort().kind() == z3.Z3_INT_SORT:
+                python_value = z3_value.as_long()
+            elif z3_value.sort().kind() == z3.Z3_REAL_SORT:
+                python_value = float(z3_value.as_decimal(10).replace('?', ''))
+            elif z3_value.sort().kind() == z3.Z3_BOOL_SORT:
+                python_value = is_true(z3_value)
+            else:
+                raise ValueError(f"Unsupported Z3 value type: {z3_value.sort().kind()}")
+            return python_value
+
+        def _state_values(self, model: z3.Model) -> dict:
+            target_vars = {}
+            for v in model.decls():
+                if v.name() == self._BLOCK_LITERAL:
+                    continue
+                # Convert Z3 values to Python values
+                target_vars[v.name()] = self._z3_value_to_python(model[v])
+            return target_vars
+
+        def _blocking_clause(self, model: z3.Model) -> z3.BoolRef:
+            return Or([v != model.eval(v, model_completion=True) for v in self._all_vars])
+
+        def _remember(self, model: z3.Model, target_vars: dict) -> None:
+            if self._block_all:
+                # permanent, but only active when checking under the assumption literal
+                self._solver.add(Implies(self._block_literal, self._blocking_clause(model)))
+            if self._block_previous:
+                for name, python_value in target_vars.items():
+                    self._cached_values[name].add(python_value)
                     # Limit the cache size to avoid memory issues
-                    if len(self._cached_values[v.name()]) > 1000:
-                        self._cached_values[v.name()].pop()
-
-            def get_state_values(model: z3.Model) -> dict:
-                target_vars = {}
-                for v in model.decls():
-                    z3_value = model[v]
-                    # Convert Z3 values to Python values
-                    python_value = z3_value_to_python(z3_value)
-                    target_vars[v.name()] = python_value
-                return target_vars
-
-            def create_state(target_vars: dict) -> State:
-                state_dict = {}
-                for constant in self._model._constants:
-                    c = copy.deepcopy(constant)
-                    if c.name in target_vars:
-                        # For constants, just verify they match (don't update)
-                        expected_value = c.value
-                        actual_value = target_vars[c.name]
-                        if abs(expected_value - actual_value) > 1e-6 if isinstance(expected_value, float) else expected_value != actual_value:
-                            raise ValueError(f"Constant {c.name} value mismatch: expected {expected_value}, got {actual_value}")
-                    state_dict[constant.name] = c
-                for variable in self._model._variables:
-                    v = copy.deepcopy(variable)
-                    if v.name in target_vars:
-                        v.value = target_vars[v.name]
-                    else:
-                        v.random(rng) # if v is unconstrainted, sample a random value
-                    state_dict[v.name] = v
-                return State(state_dict)
-
-            s = solver_with_core_constraints()
+                    if len(self._cached_values[name]) > 1000:
+                        self._cached_values[name].pop()
+
+        def _create_state(self, target_vars: dict, rng: np.random.Generator) -> State:
+            schema = self._model._schema
+            for c in self._model._constants:
+                if c.name in target_vars:
+                    # For constants, just verify they match (don't update)
+                    expected_value = c.value
+                    actual_value = target_vars[c.name]
+                    if abs(expected_value - actual_value) > 1e-6 if isinstance(expected_value, float) else expected_value != actual_value:
+                        raise ValueError(f"Constant {c.name} value mismatch: expected {expected_value}, got {actual_value}")
+            values = []
+            for v in schema.variables:
+                if v.name in target_vars:
+                    values.append(target_vars[v.name])
+                else:
+                    values.append(v.sample(rng)) # if v is unconstrainted, sample a random value
+            return State(schema, tuple(values))
+
+        def _core_values(self) -> dict:
+            s = self._solver
             if s.check() != sat:
                 raise ValueError("Failed to generate valid initial state.")
-            m = s.model()
-            backup = get_state_values(m) # backup state value
-            div_criteria = []
-            if self._block_previous:
-                if self._block_all:
-                    div_criteria = block_all_previous()
-                    s.add(And(div_criteria))
-                else:
-                    div_criteria = block_random_variable()
-                    for criterion in div_criteria:
-                        s.add(criterion)
+            return self._state_values(s.model())
+
+        def generate(self, rng: np.random.Generator) -> State:
+            # Implement constraint-based state generation
+            if self._solutions is not None:
+                if self._solutions.shape[0] == 0:
+                    raise ValueError("Failed to generate valid initial state.")
+                return self._solution_state(int(self._draw_solutions(1, rng)[0]), rng)
+            if self._solver is None:
+                self._build_solver()
+            s = self._solver
+            s.set('smt.random_seed', int(rng.integers(0, 2**31)))
+
+            backup = None
+            if self._block_previous and self._block_all:
+                result = s.check(self._block_literal)
+                model = s.model() if result == sat else None
             else:
-                for v in self._all_vars:
-                    jani_var = self._model.get_variable(str(v))
-                    if jani_var.type == 'bool':
-                        continue
-                    val = m[v]
-                    mu, sigma = z3_value_to_python(val), 2
-                    # gaussian sample with the current value being the mean
-                    r = rng.normal(mu, sigma)
-                    if jani_var.type == 'int':
-                        r = int(round(r))
-                        div_criteria.append(v == r)
-                    elif jani_var.type == 'real':
-                        div_criteria.append(v == r)
-                s.add(Or(div_criteria))
-            if s.check() == sat:
-                m = s.model()
+                s.push()
                 if self._block_previous:
-                    cache_current_values(m)
-                if self._block_all:
-                    self._cached_models.append(m)
-                return create_state(get_state_values(m))
+                    # block the values seen so far for one random variable
+                    v = self._all_vars[int(rng.integers(len(self._all_vars)))]
+                    for value in self._cached_values[str(v)]:
+                        s.add(v != value)
+                else:
+                    backup = self._core_values() # backup state value
+                    div_criteria = []
+                    for v in self._all_vars:
+                        jani_var = self._model.get_variable(str(v))
+                        if jani_var.type == 'bool' or str(v) not in backup:
+                            continue
+                        mu, sigma = backup[str(v)], 2
+                        # gaussian sample with the current value being the mean
+                        r = rng.normal(mu, sigma)
+                        if jani_var.type == 'int':
+                            r = int(round(r))
+                            div_criteria.append(v == r)
+                        elif jani_var.type == 'real':
+                            div_criteria.append(v == r)
+                    s.add(Or(div_criteria))
+                result = s.check()
+                model = s.model() if result == sat else None
+                s.pop()
+
+            if model is not None:
+                target_vars = self._state_values(model)
+                self._remember(model, target_vars)
+                return self._create_state(target_vars, rng)
+            # print("Warning: Failed to generate a random state")
+            if backup is None:
+                backup = self._core_values()
+            return self._create_state(backup, rng)
+
+        def generate_batch(self, k: int, rng: np.random.Generator) -> list[State]:
+            '''
+            Up to k states that are pairwise distinct on the constrained variables, from one
+            solver session. Fewer are returned only if the constraint has fewer solutions
+            (or, with block_all, fewer solutions not produced before).
+            '''
+            if self._solutions is not None:
+                return [self._solution_state(int(i), rng) for i in self._draw_solutions(k, rng)]
+            if self._solver is None:
+                self._build_solver()
+            s = self._solver
+            s.set('smt.random_seed', int(rng.integers(0, 2**31)))
+            assumptions = [self._block_literal] if self._block_previous and self._block_all else []
+            found = []
+            s.push()
+            for _ in range(k):
+                if s.check(*assumptions) != sat:
+                    break
+                model = s.model()
+                found.append((model, self._state_values(model)))
+                s.add(self._blocking_clause(model))
+            s.pop()
+            states = []
+            for model, target_vars in found:
+                self._remember(model, target_vars)
+                states.append(self._create_state(target_vars, rng))
+            return states
+
+    def _compile_expressions(self) -> None:
+        """Compile guards, assignments, goal and failure into functions over `State.values()`."""
+        index = self._schema.index
+        bodies: dict[str, str] = {}
+        for a, automaton in enumerate(self._automata):
+            for e, edge in enumerate(automaton._edge_list):
+                bodies[f"_guard_{a}_{e}"] = edge.guard_src(index)
+                for d, destination in enumerate(edge._destinations):
+                    bodies[f"_update_{a}_{e}_{d}"] = edge.update_src(destination, index)
+        if hasattr(self, '_goal_expr'):
+            bodies["_goal"] = self._goal_expr.to_py(index)
+        if hasattr(self, '_failure_expr'):
+            bodies["_failure"] = self._failure_expr.to_py(index)
+
+        # batch variants over a state matrix X; constant results are broadcast to one value per row
+        batch_bodies: dict[str, str] = {}
+        for a, automaton in enumerate(self._automata):
+            for e, edge in enumerate(automaton._edge_list):
+                batch_bodies[f"_batch_guard_{a}_{e}"] = _broadcast_rows(edge._guard.to_np(index))
+                for d, destination in enumerate(edge._destinations):
+                    batch_bodies[f"_batch_update_{a}_{e}_{d}"] = edge.update_batch_src(destination, index)
+        if hasattr(self, '_goal_expr'):
+            batch_bodies["_batch_goal"] = _broadcast_rows(self._goal_expr.to_np(index))
+        if hasattr(self, '_failure_expr'):
+            batch_bodies["_batch_failure"] = _broadcast_rows(self._failure_expr.to_np(index))
+
+        funcs, self._compiled_src_per_func, module_src = _compile_funcs_with_src(bodies)
+        batch_funcs, batch_src_per_func, batch_module_src = _compile_funcs_with_src(batch_bodies, arg="X")
+        funcs.update(batch_funcs)
+        self._compiled_src_per_func.update(batch_src_per_func)
+        status_src = self._status_src(index)
+        env: dict[str, Any] = {"np": np}
+        exec(status_src, env, env)
+        funcs["_status"] = env["_status"]
+        self._compiled_src_per_func["_status"] = status_src
+        self._compiled_module_src = module_src + "\n" + batch_module_src + "\n" + status_src
+        self._bind_compiled(funcs)
+
+    # status codes of _status / step
+    RUNNING, GOAL, UNSAFE, DEADLOCK = range(4)
+
+    def _status_src(self, index: dict[str, int]) -> str:
+        """
+        Source of `_status(v) -> (status, applicable action ids)` that checks goal, then
+        failure, then every action guard in one pass. Conjuncts occurring in more than one
+        of these expressions are evaluated once into locals; the rest stay inline. Conjuncts
+        that can raise (division) are never hoisted, so they keep their short-circuit guard
+        (e.g. `y != 0 ∧ x / y >= 1`).
+        """
+        automaton = self._automata[0]
+        exprs: list[Expression] = []
+        if hasattr(self, '_goal_expr'):
+            exprs.append(self._goal_expr)
+        if hasattr(self, '_failure_expr'):
+            exprs.append(self._failure_expr)
+        exprs.extend(edge._guard for edge in automaton._edge_list)
+        uses: dict[str, int] = defaultdict(int)
+        for expr in exprs:
+            for src in {c.to_py(index) for c in _conjuncts(expr) if not _can_raise(c)}:
+                uses[src] += 1
+        shared = {src: f"_c{k}" for k, src in enumerate(src for src, n in uses.items() if n > 1)}
+
+        def cond(expr: Expression) -> str:
+            srcs = dict.fromkeys(c.to_py(index) for c in _conjuncts(expr))  # repeated conjuncts once
+            return " and ".join(shared.get(src, src) for src in srcs)
+
+        lines = ["def _status(v):"]
+        lines += [f"    {name} = {src}" for src, name in shared.items()]
+        if hasattr(self, '_goal_expr'):
+            lines += [f"    if {cond(self._goal_expr)}:", f"        return {self.GOAL}, ()"]
+        if hasattr(self, '_failure_expr'):
+            lines += [f"    if {cond(self._failure_expr)}:", f"        return {self.UNSAFE}, ()"]
+        lines.append("    ids = []")
+        for action in self._actions:
+            guards = [f"({cond(edge._guard)})" for edge in automaton._edge_list if edge._label == action.label]
+            if guards:
+                lines += [f"    if {' or '.join(guards)}:", f"        ids.append({action.idx})"]
+        lines.append(f"    return ({self.RUNNING} if ids else {self.DEADLOCK}), tuple(ids)")
+        return "\n".join(lines) + "\n"
+
+    def _bind_compiled(self, funcs: dict[str, Callable]) -> None:
+        index = self._schema.index
+        for a, automaton in enumerate(self._automata):
+            for e, edge in enumerate(automaton._edge_list):
+                edge._guard_fn = funcs[f"_guard_{a}_{e}"]
+                edge._guard_batch_fn = funcs[f"_batch_guard_{a}_{e}"]
+                edge._update_fns = [funcs[f"_update_{a}_{e}_{d}"] for d in range(len(edge._destinations))]
+                edge._update_batch_fns = [funcs[f"_batch_update_{a}_{e}_{d}"] for d in range(len(edge._destinations))]
+                edge._targets = [tuple(index[assignment.target] for assignment in destination.assignments)
+                                 for destination in edge._destinations]
+        self._goal_fn = funcs.get("_goal")
+        self._failure_fn = funcs.get("_failure")
+        self._goal_batch_fn = funcs.get("_batch_goal")
+        self._failure_batch_fn = funcs.get("_batch_failure")
+        self._status_fn = funcs["_status"]
+
+    def __getstate__(self) -> dict:
+        # functions and the RNG are not stored; the compiled module source is re-executed on load
+        state = self.__dict__.copy()
+        for attr in ('_rng', '_goal_fn', '_failure_fn', '_goal_batch_fn', '_failure_batch_fn', '_status_fn'):
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        env: dict[str, Any] = {"np": np}
+        exec(self._compiled_module_src, env, env)
+        self._bind_compiled(env)
+        self._rng = np.random.default_rng()
+
+    def compiled_source(self, func_name: str | None = None, *, module: bool = False) -> str:
+        if module:
+            return self._compiled_module_src
+        if func_name is None:
+            raise ValueError("Provide func_name or set module=True.")
+        if func_name not in self._compiled_src_per_func:
+            raise KeyError(f"No compiled source captured for '{func_name}'.")
+        return self._compiled_src_per_func[func_name]
+
+    def dump_compiled(self, path: Union[str, Path]) -> None:
+        Path(path).write_text(self._compiled_module_src)
+
+    # ---------- compiled-model cache ----------
+    # Bump when the cached layout changes. The key also covers the content of every
+    # input file, the source of this module and the Python version, so editing a
+    # model, a property or the compiler invalidates the entry.
+    CACHE_VERSION = 1
+
+    @staticmethod
+    def default_cache_dir() -> Path:
+        root = os.environ.get("MICROPLAJA_CACHE_DIR")
+        return Path(root) if root else Path.home() / ".cache" / "microplaja"
+
+    @staticmethod
+    def _cache_key(files: list[Optional[Union[str, Path]]], options: tuple) -> str:
+        h = hashlib.sha256()
+        h.update(f"v{JANI.CACHE_VERSION}|py{sys.version_info[0]}.{sys.version_info[1]}|{options!r}".encode())
+        h.update(Path(__file__).read_bytes())
+        for f in files:
+            h.update(b"|")
+            if f is not None:
+                h.update(Path(f).read_bytes())
+        return h.hexdigest()[:32]
+
+    @staticmethod
+    def _property_sub_files(property_file: Union[str, Path]) -> list[Path]:
+        """Start/goal/failure files a property file delegates to (they are part of the cache key)."""
+        raw = Path(property_file).read_bytes()
+        if b'"file"' not in raw:
+            return []
+        expression = json.loads(raw)['properties'][0]['expression']
+        return [Path(property_file).parent / expression[k]['file']
+                for k in ('start', 'objective', 'reach') if 'file' in expression[k]]
+
+    @classmethod
+    def load(cls, model_file: str, start_file: str = None, goal_file: str = None, failure_file: str = None, property_file: str = None, interface_file: str = None, random_init: bool = False, seed: Optional[int] = None, block_previous: bool = True, block_all: bool = False, cache_dir: Optional[Union[str, Path]] = None, use_cache: bool = False, start_pool_size: int = 0, start_pool_workers: Optional[int] = None) -> JANI:
+        """
+        Like JANI(...), but with `use_cache` reuses a compiled model from `cache_dir` when one
+        exists for the same inputs: the pickled model (expression trees, edge tables, generated
+        source) and the fixed start states as `start_states.npy`. A cache miss parses and writes
+        the entry; an unwritable cache directory only costs the reuse. Off by default.
+        With `start_pool_size` > 0, a constraint-based start condition is replaced by a pool of
+        that many pre-solved states, stored next to the property file (see use_start_pool).
+        """
+        def build() -> JANI:
+            return cls(model_file, start_file, goal_file, failure_file, property_file, interface_file,
+                       random_init, seed, block_previous, block_all)
+
+        files = [model_file, start_file, goal_file, failure_file, property_file, interface_file]
+        if property_file is not None:
+            files += cls._property_sub_files(property_file)
+        model = cls._load_cached(build, files, (block_previous, block_all), cache_dir, seed) if use_cache else build()
+        if start_pool_size > 0 and property_file is not None:
+            model.use_start_pool(cls.start_pool_path(property_file), start_pool_size,
+                                 cls._cache_key(files, ("start_pool",)), start_pool_workers)
+        return model
+
+    @classmethod
+    def _load_cached(cls, build: Callable[[], JANI], files: list, options: tuple, cache_dir: Optional[Union[str, Path]], seed: Optional[int]) -> JANI:
+        key = cls._cache_key(files, options)
+        try:
+            entry = Path(cache_dir if cache_dir is not None else cls.default_cache_dir()) / "jani" / key
+        except RuntimeError as exc:  # no home directory to put the default cache in
+            print(f"Warning: model cache disabled: {exc}")
+            return build()
+
+        if (entry / "model.pkl").exists():
+            try:
+                with open(entry / "model.pkl", "rb") as fh:
+                    model: JANI = pickle.load(fh)
+                generator = getattr(model, '_init_generator', None)
+                if isinstance(generator, JANI.FixedGenerator):
+                    generator.set_pool_matrix(np.load(entry / "start_states.npy"))
+                model._rng = np.random.default_rng(seed)
+                return model
+            except Exception as exc:  # stale or corrupt entry: rebuild it
+                print(f"Warning: ignoring unreadable model cache {entry}: {exc}")
+
+        model = build()
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = Path(tempfile.mkdtemp(dir=entry.parent, prefix=f".{key}."))
+            with open(tmp / "model.pkl", "wb") as fh:
+                pickle.dump(model, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            generator = getattr(model, '_init_generator', None)
+            if isinstance(generator, JANI.FixedGenerator):
+                np.save(tmp / "start_states.npy", generator.pool_matrix())
+            if entry.exists():  # written concurrently by another process
+                shutil.rmtree(tmp, ignore_errors=True)
             else:
-                # print("Warning: Failed to generate a random state")
-                return create_state(backup)
+                os.replace(tmp, entry)
+        except OSError as exc:
+            print(f"Warning: could not write model cache {entry}: {exc}")
+        return model
+
+    @staticmethod
+    def start_pool_path(property_file: Union[str, Path]) -> Path:
+        """Where the pre-solved start pool of a property is stored: next to the property file."""
+        property_file = Path(property_file)
+        return property_file.with_name(property_file.stem + ".start_pool.npz")
+
+    def pregenerate_start_pool(self, n: int, workers: Optional[int] = None, chunk_size: int = 256) -> np.ndarray:
+        """
+        Solve up to n distinct start states of a constraint-based start condition in a process
+        pool. Each worker returns a batch of states distinct on the constrained variables;
+        duplicates across workers are dropped. Returns fewer rows only if the condition has
+        fewer solutions.
+        """
+        if not isinstance(getattr(self, '_init_generator', None), JANI.ConstraintsGenerator):
+            raise ValueError("Start pools can only be pre-generated for constraint-based start states.")
+        workers = workers or os.cpu_count() or 1
+        rows = np.empty((0, len(self._schema)), dtype=np.float64 if any(v.type == 'real' for v in self._schema.variables) else np.int64)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while rows.shape[0] < n:
+                missing = n - rows.shape[0]
+                sizes = [min(chunk_size, missing - i) for i in range(0, missing, chunk_size)]
+                futures = [pool.submit(_start_pool_chunk, self, k, int(self._rng.integers(0, 2**31))) for k in sizes]
+                merged = np.concatenate([rows] + [f.result().astype(rows.dtype).reshape(-1, rows.shape[1]) for f in futures])
+                # drop duplicates, keeping generation order
+                _, first = np.unique(merged, axis=0, return_index=True)
+                merged = merged[np.sort(first)]
+                if merged.shape[0] == rows.shape[0]:  # no new solutions left
+                    break
+                rows = merged
+        return rows[:n]
+
+    def use_start_pool(self, path: Union[str, Path], n: int, key: str, workers: Optional[int] = None) -> bool:
+        """
+        Replace constraint-based start generation by a fixed pool of at least n pre-solved
+        states. The pool is read from `path` when it was written for the same inputs (`key`)
+        and is large enough, and otherwise pre-generated and written there. Returns False
+        (and changes nothing) for models whose start states are not constraint-based.
+        """
+        if not isinstance(getattr(self, '_init_generator', None), JANI.ConstraintsGenerator):
+            return False
+        path = Path(path)
+        rows = None
+        if path.exists():
+            try:
+                with np.load(path) as stored:
+                    if str(stored['key']) == key and set(stored['names'].tolist()) == set(self._schema.names):
+                        # columns are stored by name, so a different interface order still matches
+                        order = [stored['names'].tolist().index(name) for name in self._schema.names]
+                        rows = stored['states'][:, order]
+            except Exception as exc:  # unreadable pool: regenerate it
+                print(f"Warning: ignoring unreadable start pool {path}: {exc}")
+        if rows is None or rows.shape[0] < n:
+            rows = self.pregenerate_start_pool(n, workers)
+            if rows.shape[0] == 0:
+                raise ValueError("The start condition has no solutions.")
+            try:
+                fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".npz")
+                with os.fdopen(fd, "wb") as fh:
+                    np.savez(fh, states=rows, names=np.array(self._schema.names), key=np.array(key))
+                os.replace(tmp, path)
+            except OSError as exc:
+                print(f"Warning: could not write start pool {path}: {exc}")
+        self._init_generator = JANI.FixedGenerator.from_matrix(rows, self)
+        return True
 
     def reset(self) -> State:
         """Reset the JANI model to a random initial state."""
         return self._init_generator.generate(self._rng)
     
+    def reset_batch(self, k: int) -> list[State]:
+        """Draw k initial states at once (distinct ones for constraint-based starts)."""
+        return self._init_generator.generate_batch(k, self._rng)
+
+    def start_pool(self) -> Optional[np.ndarray]:
+        """The (n_starts, n_vars) start matrix for fixed start sets, None for generated starts."""
+        generator = getattr(self, '_init_generator', None)
+        if isinstance(generator, JANI.FixedGenerator):
+            return generator.pool_matrix()
+        return None
+
     def get_action_count(self) -> int:
         return len(self._actions)
     
     def get_constants_variables(self) -> list[Variable]:
         return self._constants + self._variables
+
+    def get_schema(self) -> StateSchema:
+        return self._schema
     
     def get_variable(self, variable_name: str) -> Variable:
         """Get a variable by its name."""
@@ -912,19 +1777,139 @@ class JANI:
         #return self._automata[0].transit(state, action, return_all=True, rng=self._rng)
         return self._automata[0].transit(state, action, return_all=False, rng=self._rng)
 
+    def status(self, state: State) -> tuple[int, tuple[int, ...]]:
+        """(status, applicable action ids) of a state; status is GOAL, UNSAFE, DEADLOCK or RUNNING."""
+        return self._status_fn(state.values())
+
+    def step(self, state: State, action: int) -> tuple[State, int, tuple[int, ...]]:
+        """
+        Sample a successor under action id `action` (an enabled edge uniformly, then a
+        destination by probability) and return it with its status and applicable action ids.
+        """
+        automaton = self._automata[0]
+        edges = automaton._enabled_edges(state, automaton._action_masks[self._actions[action].label])
+        if not edges:
+            raise ValueError(f"Action {self._actions[action].label} is not applicable.")
+        edge = edges[0] if len(edges) == 1 else edges[int(self._rng.integers(len(edges)))]
+        successor = edge.sample(state, self._rng)
+        return (successor,) + self._status_fn(successor.values())
+
+    def get_distributions(self, state: State, action: Action) -> list[tuple[list[State], list[float]]]:
+        return self._automata[0].distributions(state, action)
+
     def get_action(self, action_index: int) -> Action:
         if action_index < 0 or action_index >= len(self._actions):
             raise ValueError(f"Invalid action index {action_index}. Must be between 0 and {len(self._actions)-1}")
         return self._actions[action_index]
 
+    def applicable_actions(self, state: State) -> list[Action]:
+        """Actions with at least one enabled edge, in action index order."""
+        labels = self._automata[0].enabled_labels(state)
+        return [action for action in self._actions if action.label in labels]
+
     def get_edges_for_action(self, action_index: int) -> list[Edge]:
         action_obj = self._actions[action_index]
         return self._automata[0].get_edges(action_obj)
 
     def goal_reached(self, state: State) -> bool:
         # Implement the logic to check if the goal state is reached
-        return self._goal_expr.evaluate(state)
+        return self._goal_fn(state.values())
 
     def failure_reached(self, state: State) -> bool:
         # Implement the logic to check if the failure state is reached
-        return self._failure_expr.evaluate(state)
\ No newline at end of file
+        return self._failure_fn(state.values())
+
+    # ---------- batch evaluation over state matrices (N, n_vars), columns by idx ----------
+    def to_matrix(self, states: list[State], dtype: Any = None) -> np.ndarray:
+        """Stack states into an (N, n_vars) matrix, columns by schema position (constants excluded)."""
+        n_cols = len(self._schema)
+        if not states:
+            return np.empty((0, n_cols), dtype=dtype if dtype is not None else np.int64)
+        return np.asarray([state.values() for state in states], dtype=dtype)
+
+    def goal_reached_batch(self, X: np.ndarray) -> np.ndarray:
+        return self._goal_batch_fn(X)
+
+    def failure_reached_batch(self, X: np.ndarray) -> np.ndarray:
+        return self._failure_batch_fn(X)
+
+    def enabled_edges_batch(self, X: np.ndarray) -> np.ndarray:
+        """Bool matrix (N, n_edges): guard of every edge (automaton edge order) on every row of X."""
+        edges = self._automata[0]._edge_list
+        out = np.empty((X.shape[0], len(edges)), dtype=bool)
+        for e, edge in enumerate(edges):
+            out[:, e] = edge.is_enabled_batch(X)
+        return out
+
+    def successors_batch(self, X: np.ndarray, actions: np.ndarray, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        One sampled successor per row of X under the action id in `actions` (N,): an enabled
+        edge of that action uniformly at random, then a destination by probability, as
+        JaniEnvironment.successor_states + random.choice do for one state. All random
+        numbers come from a single draw. Raises ValueError if an action is not applicable.
+        """
+        if rng is None:
+            rng = self._rng
+        edges = self._automata[0]._edge_list
+        n = X.shape[0]
+        actions = np.asarray(actions)
+        label_ids = {action.label: action.idx for action in self._actions}
+        # guards only of the edges of each row's chosen action
+        enabled = np.zeros((n, len(edges)), dtype=bool)
+        for e, edge in enumerate(edges):
+            rows = np.flatnonzero(actions == label_ids[edge._label])
+            if rows.size:
+                enabled[rows, e] = edge.is_enabled_batch(X[rows])
+        counts = enabled.sum(axis=1)
+        if (counts == 0).any():
+            row = int(np.flatnonzero(counts == 0)[0])
+            raise ValueError(f"Action {self._actions[int(actions[row])].label} is not applicable in row {row}.")
+
+        u = rng.random((n, 2))  # column 0 picks the edge, column 1 the destination
+        pick = np.minimum((u[:, 0] * counts).astype(np.int64), counts - 1)
+        chosen = np.argmax(np.cumsum(enabled, axis=1) > pick[:, None], axis=1)
+
+        Y = X.copy()
+        for e in np.unique(chosen).tolist():
+            edge = edges[e]
+            rows = np.flatnonzero(chosen == e)
+            if len(edge._destinations) == 1:
+                dests = np.zeros(rows.size, dtype=np.int64)
+            else:
+                dests = np.minimum(np.searchsorted(edge._cum_probs, u[rows, 1], side='right'), len(edge._destinations) - 1)
+            for d in np.unique(dests).tolist():
+                sub = rows[dests == d]
+                targets = edge._targets[d]
+                if targets:
+                    values = np.stack(edge._update_batch_fns[d](X[sub]), axis=1)
+                    self._check_fits(values, Y.dtype, edge, targets)
+                    Y[np.ix_(sub, targets)] = values
+        return Y
+
+    def _check_fits(self, values: np.ndarray, dtype: np.dtype, edge: Edge, targets: list[int]) -> None:
+        """
+        Raise ValueError if storing update results in a state matrix of `dtype` would change
+        them: non-integral or non-finite values in an integer matrix, or values outside its
+        range. The scalar step keeps such values as they are; the batch path must not
+        truncate or wrap them silently.
+        """
+        if not np.issubdtype(dtype, np.integer) or np.can_cast(values.dtype, dtype, 'safe'):
+            return
+        info = np.iinfo(dtype)
+        with np.errstate(invalid='ignore'):
+            ok = np.isfinite(values) & (values >= info.min) & (values <= info.max)
+            if not np.issubdtype(values.dtype, np.integer):
+                ok &= values == np.floor(values)
+        if not ok.all():
+            row, col = np.argwhere(~ok)[0]
+            raise ValueError(f"Update of {self._schema.names[targets[col]]} on edge {edge._label} gives "
+                             f"{values[row, col]}, which does not fit the {np.dtype(dtype)} state matrix "
+                             f"(use a float matrix, e.g. to_matrix(states, dtype=np.float64)).")
+
+    def applicable_batch(self, X: np.ndarray) -> np.ndarray:
+        """Bool matrix (N, n_actions): an action is applicable if any of its edges is enabled."""
+        out = np.zeros((X.shape[0], len(self._actions)), dtype=bool)
+        for action in self._actions:
+            for edge in self._automata[0]._edges.get(action.label, []):
+                out[:, action.idx] |= edge.is_enabled_batch(X)
+        return out
\ No newline at end of file
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Union, Sequence
+from typing import Any, Dict, List, Optional, Tuple, Union, Sequence
 import json
 
+import numpy as np
+
 
 class ModelAdapter:
     def encode(self, state: Dict[str, Any]) -> Any:
@@ -43,6 +45,62 @@ class RRLAdapter(ModelAdapter):
         self._class_to_action: Dict[str, str] = {
             f"class_{k}": act for k, act in enumerate(self.outputs)
         }
+        # atom order -> per input: column of value lo + k (-1 for lo and for unused atoms)
+        self._column_tables: Dict[Tuple[str, ...], List[np.ndarray]] = {}
+        self._last_atoms: Optional[Sequence[str]] = None
+        self._last_tables: List[np.ndarray] = []
+
+    def _columns(self, atoms: Tuple[str, ...]) -> List[np.ndarray]:
+        tables = self._column_tables.get(atoms)
+        if tables is None:
+            col = {a: j for j, a in enumerate(atoms)}
+            tables = []
+            for nm in self.input_names:
+                lo, hi = int(self.bounds[nm][0]), int(self.bounds[nm][1])
+                table = np.full(hi - lo + 1, -1, dtype=np.int64)
+                for val in range(lo + 1, hi + 1):
+                    table[val - lo] = col.get(self.bstate_map[(nm, val)], -1)
+                tables.append(table)
+            self._column_tables[atoms] = tables
+        return tables
+
+    def encode_batch(self, X: np.ndarray, atoms: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Encode an (N, n_inputs) integer matrix (columns in interface input order) into an
+        (N, n_atoms) bool matrix, columns in `atoms` order (e.g. SymbolicModel.atoms;
+        default: bstate_map order). Same atoms as encode, row by row.
+        """
+        atoms = tuple(atoms) if atoms is not None else tuple(self.bstate_map.values())
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != len(self.input_names):
+            raise ValueError(f"Expected an (N, {len(self.input_names)}) matrix, got shape {X.shape}")
+        out = np.zeros((X.shape[0], len(atoms)), dtype=bool)
+        rows = np.arange(X.shape[0])
+        for i, (nm, table) in enumerate(zip(self.input_names, self._columns(atoms))):
+            k = X[:, i].astype(np.int64) - int(self.bounds[nm][0])
+            if k.size and (k.min() < 0 or k.max() >= table.size):
+                raise KeyError(f"Value of '{nm}' outside its bounds {self.bounds[nm]}")
+            cols = table[k]
+            hit = cols >= 0
+            out[rows[hit], cols[hit]] = True
+        return out
+
+    def encode_active(self, state: Dict[str, Any], atoms: Sequence[str]) -> List[int]:
+        """
+        Sparse encode: indices (into `atoms`) of the true atoms only, at most one per input.
+        """
+        if self._last_atoms is not atoms:  # per-call fast path for a fixed atom list
+            self._last_atoms, self._last_tables = atoms, self._columns(tuple(atoms))
+        active = []
+        for nm, table in zip(self.input_names, self._last_tables):
+            k = int(state[nm]) - int(self.bounds[nm][0])
+            if k:
+                if not 0 < k < table.size:
+                    raise KeyError((nm, int(state[nm])))
+                col = int(table[k])
+                if col >= 0:
+                    active.append(col)
+        return active
 
     def encode(self, state: Dict[str, Any]) -> Dict[str, bool]:
         A = {bs: False for bs in self.bstate_map.values()}
@@ -66,10 +124,35 @@ class NNAdapter(ModelAdapter):
     interface_path: Union[str, Path]
 
     def __post_init__(self) -> None:
-        pass
+        if isinstance(self.var_bounds, dict):
+            self.bounds: Dict[str, Tuple[int, int]] = self.var_bounds
+        else:
+            self.bounds = {name: (lo, hi) for name, lo, hi in self.var_bounds}
+
+        p = Path(self.interface_path)
+        obj = json.loads(p.read_text(encoding="utf-8"))
+        if "input" not in obj or "output" not in obj:
+            raise ValueError(f"{p} must contain 'input' and 'output' fields")
+
+        self.input_names: List[str] = [x["name"] for x in obj["input"]]
+        self.outputs: List[str] = list(obj["output"])
+        # the PlaJa network this interface was exported with (.nnet, next to the interface)
+        self.network_path: Optional[Path] = p.parent / obj["file"] if obj.get("file") else None
 
     def encode(self, state: Dict[str, Any]) -> List[float]:
-        pass
+        """Raw input values in interface input order (the network normalizes them)."""
+        return [float(state[nm]) for nm in self.input_names]
+
+    def encode_batch(self, X: np.ndarray) -> np.ndarray:
+        """(N, n_inputs) matrix in interface input order -> float32 network input."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(self.input_names):
+            raise ValueError(f"Expected an (N, {len(self.input_names)}) matrix, got shape {X.shape}")
+        return X
 
     def decode(self, pred: Any) -> str:
-        pass
+        """Output index (or RRL-style 'class_k' label) -> action name."""
+        k = int(str(pred).split("_", 1)[1]) if str(pred).startswith("class_") else int(pred)
+        if not 0 <= k < len(self.outputs):
+            raise KeyError(f"Unknown output index {pred!r}.")
+        return self.outputs[k]
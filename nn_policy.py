@@ -0,0 +1,135 @@
+# Policy: transforms raw state -> input vector via adapter, runs a PlaJa .nnet network with PyTorch.
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path as _Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from model_adapter import NNAdapter
+
+try:
+    import torch
+except ImportError:  # only needed once an NNPolicy is built
+    torch = None
+
+
+@dataclass
+class NNet:
+    """A feed-forward ReLU network in the .nnet format PlaJa reads and writes."""
+    weights: List[np.ndarray]   # per layer: (out, in)
+    biases: List[np.ndarray]    # per layer: (out,)
+    input_mins: np.ndarray
+    input_maxes: np.ndarray
+    means: np.ndarray           # n_inputs + 1 (last: outputs)
+    ranges: np.ndarray          # n_inputs + 1 (last: outputs)
+
+    @classmethod
+    def load(cls, path: Union[str, _Path]) -> "NNet":
+        lines = [ln.strip() for ln in _Path(path).read_text().splitlines()]
+        lines = [ln for ln in lines if ln and not ln.startswith("//")]
+
+        def row(i: int) -> List[float]:
+            return [float(x) for x in lines[i].split(",") if x.strip()]
+
+        n_layers, n_inputs, _, _ = (int(x) for x in row(0)[:4])
+        sizes = [int(x) for x in row(1)]
+        if len(sizes) != n_layers + 1 or sizes[0] != n_inputs:
+            raise ValueError(f"{path}: inconsistent layer sizes {sizes}")
+        # row 2 is the unused "symmetric" flag
+        mins, maxes = np.array(row(3)), np.array(row(4))
+        means, ranges = np.array(row(5)), np.array(row(6))
+
+        weights, biases = [], []
+        i = 7
+        for k in range(n_layers):
+            n_in, n_out = sizes[k], sizes[k + 1]
+            weights.append(np.array([row(i + r) for r in range(n_out)], dtype=np.float32).reshape(n_out, n_in))
+            i += n_out
+            biases.append(np.array([row(i + r)[0] for r in range(n_out)], dtype=np.float32))
+            i += n_out
+        return cls(weights, biases, mins, maxes, means, ranges)
+
+
+class NNPolicy:
+    """
+    Acts with the network named in the interface ("file", next to the .jani2nnet) or given
+    as `model_path`. Inputs are clipped and normalized as the .nnet header says; hidden
+    layers use ReLU. Inference runs on CPU under torch.inference_mode with `threads`
+    intra-op threads (None: PyTorch default).
+    """
+    def __init__(
+        self,
+        adapter: NNAdapter,
+        model_path: Optional[Union[str, _Path]] = None,
+        threads: Optional[int] = None,
+    ) -> None:
+        if torch is None:
+            raise ImportError("NNPolicy requires PyTorch (pip install torch).")
+        if model_path is None:
+            model_path = adapter.network_path
+        if model_path is None:
+            raise ValueError("No network to load: pass --nnet (model_path) or add \"file\" to the .jani2nnet interface.")
+        if threads is not None:
+            torch.set_num_threads(threads)
+        self.adapter = adapter
+        self.net = NNet.load(model_path)
+        if self.net.weights[0].shape[1] != len(adapter.input_names):
+            raise ValueError(
+                f"Network has {self.net.weights[0].shape[1]} inputs, "
+                f"interface has {len(adapter.input_names)}"
+            )
+        if self.net.weights[-1].shape[0] != len(adapter.outputs):
+            raise ValueError(
+                f"Network has {self.net.weights[-1].shape[0]} outputs, "
+                f"interface has {len(adapter.outputs)}"
+            )
+
+        layers: List[Any] = []
+        for k, (W, b) in enumerate(zip(self.net.weights, self.net.biases)):
+            lin = torch.nn.Linear(W.shape[1], W.shape[0])
+            with torch.no_grad():
+                lin.weight.copy_(torch.from_numpy(W))
+                lin.bias.copy_(torch.from_numpy(b))
+            layers.append(lin)
+            if k < len(self.net.weights) - 1:
+                layers.append(torch.nn.ReLU())
+        self.model = torch.nn.Sequential(*layers).eval()
+
+        n = len(adapter.input_names)
+        self._lo = torch.from_numpy(self.net.input_mins[:n].astype(np.float32))
+        self._hi = torch.from_numpy(self.net.input_maxes[:n].astype(np.float32))
+        self._mean = torch.from_numpy(self.net.means[:n].astype(np.float32))
+        self._range = torch.from_numpy(self.net.ranges[:n].astype(np.float32))
+        self._out_mean = float(self.net.means[n])
+        self._out_range = float(self.net.ranges[n])
+
+    def forward_batch(self, X: np.ndarray) -> np.ndarray:
+        """(N, n_inputs) raw inputs (interface order) -> (N, n_outputs) scores."""
+        with torch.inference_mode():
+            x = torch.as_tensor(self.adapter.encode_batch(X))
+            x = (torch.clamp(x, self._lo, self._hi) - self._mean) / self._range
+            y = self.model(x) * self._out_range + self._out_mean
+            return y.numpy()
+
+    def act_batch(self, X: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """
+        Highest-scored applicable output per row. `mask` is (N, n_outputs) applicability in
+        interface output order; rows without applicable output get output 0.
+        """
+        scores = self.forward_batch(X)
+        scores = np.where(mask, scores, -np.inf)
+        return np.argmax(scores, axis=1)
+
+    def act(self, state: Dict[str, Any], applicable: List[str]) -> str:
+        scores = self.forward_batch(np.asarray([self.adapter.encode(state)]))[0]
+
+        for k in np.argsort(-scores, kind="stable"):
+            act = self.adapter.decode(int(k))
+            if act in applicable:
+                return act
+
+        if not applicable:
+            raise RuntimeError("No applicable actions to choose from.")
+        return applicable[0]
@@ -0,0 +1,228 @@
+# Exact evaluation of a policy on a JANI model via its induced Markov chain.
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from jani_parser import JANI, State
+from reachability import Policy, default_start_states
+
+
+@dataclass
+class MarkovChain:
+    """
+    Markov chain induced by a policy, over the states reachable from the start states.
+    Transitions are stored as CSR arrays (row i: probs[indptr[i]:indptr[i+1]] to
+    indices[...]); goal, unsafe and deadlock states are absorbing and have empty rows.
+    """
+    states: List[State]
+    start: np.ndarray      # (n_starts,) state indices
+    goal: np.ndarray       # (n_states,) bool
+    unsafe: np.ndarray     # (n_states,) bool, never set on goal states
+    deadlock: np.ndarray   # (n_states,) bool
+    indptr: np.ndarray     # (n_states + 1,)
+    indices: np.ndarray    # (nnz,)
+    probs: np.ndarray      # (nnz,)
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    @property
+    def terminal(self) -> np.ndarray:
+        return self.goal | self.unsafe | self.deadlock
+
+
+def _action_distribution(jani: JANI, state: State, action) -> Dict[tuple, Tuple[State, float]]:
+    """
+    Successor distribution of one action, as runner.evaluate_episode samples it: an enabled
+    edge uniformly at random, then one of its destinations by probability.
+    """
+    dists = jani.get_distributions(state, action)
+    out: Dict[tuple, Tuple[State, float]] = {}
+    for destinations, cum_probs in dists:
+        prev = 0.0
+        for s2, cum in zip(destinations, cum_probs):
+            p = (cum - prev) / len(dists)
+            prev = cum
+            key = s2.values()
+            out[key] = (s2, out[key][1] + p) if key in out else (s2, p)
+    return out
+
+
+def build_chain(jani: JANI, start_states: List[State], policy: Optional[Policy] = None, max_states: Optional[int] = None) -> MarkovChain:
+    """
+    Explore the chain induced by `policy` (a deterministic act(state_dict, labels) -> label)
+    or, without one, by the uniform choice among applicable actions (RandomPolicy).
+    Goal is checked before unsafe, as in the runner.
+    """
+    index: Dict[tuple, int] = {}
+    states: List[State] = []
+
+    def visit(s: State) -> int:
+        i = index.get(s.values())
+        if i is None:
+            if max_states is not None and len(states) >= max_states:
+                raise RuntimeError(f"More than {max_states} reachable states; raise max_states.")
+            i = index[s.values()] = len(states)
+            states.append(s)
+        return i
+
+    start = np.asarray([visit(s) for s in start_states], dtype=np.int64)
+    goal, unsafe, deadlock = [], [], []
+    indptr, indices, probs = [0], [], []
+    i = 0
+    while i < len(states):  # states grows while it is scanned (BFS order)
+        s = states[i]
+        g = jani.goal_reached(s)
+        u = not g and jani.failure_reached(s)
+        applicable = [] if g or u else jani.applicable_actions(s)
+        goal.append(g)
+        unsafe.append(u)
+        deadlock.append(not g and not u and not applicable)
+        if applicable:
+            if policy is not None:
+                label = policy.act(s.to_dict(), [a.label for a in applicable])
+                choices = [a for a in applicable if a.label == label]
+            else:
+                choices = applicable
+            row: Dict[int, float] = {}
+            for action in choices:
+                for s2, p in _action_distribution(jani, s, action).values():
+                    j = visit(s2)
+                    row[j] = row.get(j, 0.0) + p / len(choices)
+            indices.extend(row.keys())
+            probs.extend(row.values())
+        indptr.append(len(indices))
+        i += 1
+
+    return MarkovChain(
+        states=states,
+        start=start,
+        goal=np.asarray(goal, dtype=bool),
+        unsafe=np.asarray(unsafe, dtype=bool),
+        deadlock=np.asarray(deadlock, dtype=bool),
+        indptr=np.asarray(indptr, dtype=np.int64),
+        indices=np.asarray(indices, dtype=np.int64),
+        probs=np.asarray(probs, dtype=np.float64),
+    )
+
+
+def reach_probabilities(chain: MarkovChain, max_steps: Optional[int] = None, tol: float = 1e-12, max_iter: int = 1_000_000) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Probability of reaching a goal and an unsafe state from every state of the chain, by
+    value iteration over both targets at once. With max_steps, runs are cut off as in
+    runner.evaluate_episode (a state is checked after at most max_steps - 1 actions);
+    otherwise iterates until the largest change is below tol.
+    Returns (p_goal, p_unsafe, iterations).
+    """
+    V = np.zeros((len(chain), 2))
+    V[chain.goal, 0] = 1.0
+    V[chain.unsafe, 1] = 1.0
+
+    # only non-terminal rows have entries, and each has at least one, so their CSR
+    # offsets are valid reduceat boundaries over the whole data array
+    rows = np.flatnonzero(~chain.terminal)
+    offsets = chain.indptr[rows]
+    cols, probs = chain.indices, chain.probs[:, None]
+
+    steps = max_iter if max_steps is None else max(0, max_steps - 1)
+    it = 0
+    while it < steps and rows.size:
+        new = np.add.reduceat(probs * V[cols], offsets, axis=0)
+        delta = np.abs(new - V[rows]).max()
+        V[rows] = new
+        it += 1
+        if max_steps is None and delta < tol:
+            break
+    return V[:, 0], V[:, 1], it
+
+
+def main(
+    jani_file: str,
+    property_file: str,
+    interface_file: Optional[str] = None,
+    policy_kind: str = "rrl",
+    sym_model: Optional[str] = None,
+    max_steps: Optional[int] = None,
+    starts: int = 1000,
+    max_states: Optional[int] = None,
+    out: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> Tuple[MarkovChain, np.ndarray, np.ndarray]:
+    from jani_environment import load_env
+
+    M = load_env(jani_file, property_file, seed=seed)
+    policy: Optional[Policy] = None
+    if policy_kind in ("rrl", "rule-based"):
+        from rrl_policy import RRLPolicy
+        from model_adapter import RRLAdapter
+        if not sym_model or not interface_file:
+            raise ValueError("--sym_model and --interface are required when --policy rrl")
+        adapter = RRLAdapter(var_bounds=M.variables, interface_path=interface_file)
+        policy = RRLPolicy(model_path=sym_model, adapter=adapter, eval_mode="compiled")
+    elif policy_kind != "random":
+        raise ValueError(f"Unknown --policy '{policy_kind}' (use 'random' or 'rrl').")
+
+    t0 = time.perf_counter()
+    chain = build_chain(M.jani, default_start_states(M.jani, starts), policy, max_states=max_states)
+    t1 = time.perf_counter()
+    p_goal, p_unsafe, iterations = reach_probabilities(chain, max_steps=max_steps)
+    t2 = time.perf_counter()
+
+    g, u = p_goal[chain.start], p_unsafe[chain.start]
+    print(
+        f"\n[EXACT {policy_kind.upper()} x JANI] starts={chain.start.size}  states={len(chain)}  "
+        f"goal={g.mean():.4f}  unsafe={u.mean():.4f}  timeout={max(0.0, 1.0 - g.mean() - u.mean()):.4f}"
+    )
+    print(
+        f"[exact] transitions={chain.indices.size}  deadlocks={int(chain.deadlock.sum())}  iterations={iterations}  "
+        f"build={t1 - t0:.2f}s  solve={t2 - t1:.2f}s"
+    )
+    if out is not None:
+        with open(out, "w") as fh:
+            for i, pg, pu in zip(chain.start.tolist(), g.tolist(), u.tolist()):
+                fh.write(json.dumps({"state": chain.states[i].to_dict(), "goal": pg, "unsafe": pu}) + "\n")
+    return chain, p_goal, p_unsafe
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jani", required=True, help="Path to environment .jani (JSON)")
+    ap.add_argument("--property", required=True, help="Path to property .jani (start/goal/failure)")
+    ap.add_argument("--interface", help="Path to interface .jani2nnet (required if --policy rrl)")
+    ap.add_argument(
+        "--policy", choices=["random", "rrl", "rule-based"], default="rrl",
+        help="Policy to evaluate: uniform random baseline or rule-based (RRL)",
+    )
+    ap.add_argument("--sym_model", help="Path to raw symbolic model .JSON (required if --policy rrl)")
+    ap.add_argument(
+        "--max_steps", type=int, default=None,
+        help="Cut runs off like runner.py --max_steps (default: unbounded)",
+    )
+    ap.add_argument(
+        "--starts", type=int, default=1000,
+        help="Start states drawn when the property has no fixed start set",
+    )
+    ap.add_argument("--max_states", type=int, default=None, help="Fail if the chain gets larger")
+    ap.add_argument("--out", help="Write per-start-state probabilities as JSONL")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    main(
+        jani_file=args.jani,
+        property_file=args.property,
+        interface_file=args.interface,
+        policy_kind=args.policy,
+        sym_model=args.sym_model,
+        max_steps=args.max_steps,
+        starts=args.starts,
+        max_states=args.max_states,
+        out=args.out,
+        seed=args.seed,
+    )
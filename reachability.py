@@ -0,0 +1,344 @@
+# Explicit-state reachability analysis of a JANI model (all actions or a fixed policy).
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Protocol
+
+import numpy as np
+
+from jani_parser import JANI, State, StateSchema
+
+
+class Policy(Protocol):
+    def act(self, state: Dict[str, Any], applicable: List[str]) -> str: ...
+
+
+class StatePacker:
+    """
+    Packs states of a schema into fixed-width integer keys: every variable gets
+    ceil(log2(hi - lo + 1)) bits from its bounds, in schema order. Keys are Python
+    ints; `dtype` is uint64 when they fit into 64 bits (needed for the sorted visited set).
+    Values outside a variable's bounds raise ValueError instead of corrupting the key.
+    """
+    def __init__(self, schema: StateSchema):
+        self.schema = schema
+        self.lows: List[int] = []
+        self.highs: List[int] = []
+        self.widths: List[int] = []
+        for v in schema.variables:
+            if v.type == 'bool':
+                lo, hi = 0, 1
+            elif v.type == 'int' and v.lower_bound is not None and v.upper_bound is not None:
+                lo, hi = int(v.lower_bound), int(v.upper_bound)
+            else:
+                raise ValueError(f"Variable {v.name} ({v.type}) has no finite integer domain; states cannot be packed.")
+            self.lows.append(lo)
+            self.highs.append(hi)
+            self.widths.append(max(1, (hi - lo).bit_length()))
+        self.shifts: List[int] = []
+        shift = 0
+        for width in reversed(self.widths):
+            self.shifts.append(shift)
+            shift += width
+        self.shifts.reverse()
+        self.bits = shift
+        self.dtype = np.uint64 if self.bits <= 64 else None
+
+    def pack(self, values: Iterable[Any]) -> int:
+        key = 0
+        for pos, (value, lo, hi, width) in enumerate(zip(values, self.lows, self.highs, self.widths)):
+            if not lo <= value <= hi:
+                self._out_of_bounds(pos, value)
+            key = (key << width) | (int(value) - lo)
+        return key
+
+    def _out_of_bounds(self, pos: int, value: Any) -> None:
+        raise ValueError(f"Variable {self.schema.names[pos]} = {value} is outside its bounds "
+                         f"[{self.lows[pos]}, {self.highs[pos]}]; the state cannot be packed.")
+
+    def unpack(self, key: int) -> State:
+        values = [((key >> shift) & ((1 << width) - 1)) + lo
+                  for shift, width, lo in zip(self.shifts, self.widths, self.lows)]
+        return State(self.schema, self.schema.cast(values))
+
+    def pack_batch(self, X: np.ndarray) -> np.ndarray:
+        """Keys of all rows of an (N, n_vars) matrix as uint64 (requires bits <= 64)."""
+        if self.dtype is None:
+            raise ValueError(f"States need {self.bits} bits; batch packing supports at most 64.")
+        offsets = X.astype(np.int64) - np.asarray(self.lows, dtype=np.int64)
+        bad = (X < self.lows) | (X > self.highs)
+        if bad.any():
+            row, col = np.argwhere(bad)[0]
+            self._out_of_bounds(int(col), X[row, col])
+        keys = np.zeros(X.shape[0], dtype=np.uint64)
+        for col, shift in enumerate(self.shifts):
+            keys |= offsets[:, col].astype(np.uint64) << np.uint64(shift)
+        return keys
+
+
+@dataclass
+class ExplorationResult:
+    states: int = 0            # distinct reachable states (incl. start states)
+    transitions: int = 0       # expanded (state, successor) pairs, duplicates included
+    depth: int = 0             # largest BFS layer / DFS path length reached
+    starts: int = 0
+    goal: int = 0
+    unsafe: int = 0
+    deadlock: int = 0          # non-terminal states without applicable action
+    truncated: bool = False    # stopped by max_states / max_depth
+    seconds: float = 0.0
+    layer_sizes: List[int] = field(default_factory=list)  # BFS only: new states per depth
+
+    @property
+    def states_per_second(self) -> float:
+        return self.states / self.seconds if self.seconds > 0 else float("inf")
+
+
+class Explorer:
+    """
+    BFS/DFS over the states reachable from a set of start states. Without a policy every
+    applicable action is followed; with one, only the action the policy picks. Every
+    destination of every enabled edge is a successor. Goal and unsafe states are counted
+    but not expanded (episodes end there).
+
+    visited: "hash" keeps packed keys in a Python set; "sorted" keeps them in a sorted
+    uint64 array merged once per BFS layer (smaller, BFS only).
+    """
+    def __init__(self, jani: JANI, policy: Optional[Policy] = None, order: str = "bfs", visited: str = "hash"):
+        if order not in ("bfs", "dfs"):
+            raise ValueError(f"Unknown order '{order}' (use 'bfs' or 'dfs').")
+        if visited not in ("hash", "sorted"):
+            raise ValueError(f"Unknown visited set '{visited}' (use 'hash' or 'sorted').")
+        if visited == "sorted" and order != "bfs":
+            raise ValueError("The sorted visited set is merged per BFS layer; use it with order='bfs'.")
+        self.jani = jani
+        self.policy = policy
+        self.order = order
+        self.visited = visited
+        self.packer = StatePacker(jani.get_schema())
+        if visited == "sorted" and self.packer.dtype is None:
+            raise ValueError(f"States need {self.packer.bits} bits; the sorted visited set supports at most 64.")
+
+    def successors(self, state: State) -> List[State]:
+        """Successor states (with duplicates); empty for deadlocks."""
+        applicable = self.jani.applicable_actions(state)
+        if self.policy is not None and applicable:
+            label = self.policy.act(state.to_dict(), [a.label for a in applicable])
+            applicable = [a for a in applicable if a.label == label]
+        result = []
+        for action in applicable:
+            for destinations, _ in self.jani.get_distributions(state, action):
+                result.extend(destinations)
+        return result
+
+    def _expand(self, state: State, res: ExplorationResult) -> Optional[List[State]]:
+        """Classify a newly visited state; successors of non-terminal states."""
+        if self.jani.goal_reached(state):
+            res.goal += 1
+            return None
+        if self.jani.failure_reached(state):
+            res.unsafe += 1
+            return None
+        succs = self.successors(state)
+        if not succs:
+            res.deadlock += 1
+        res.transitions += len(succs)
+        return succs
+
+    def run(self, start_states: List[State], max_states: Optional[int] = None, max_depth: Optional[int] = None) -> ExplorationResult:
+        t0 = time.perf_counter()
+        if self.visited == "sorted":
+            res = self._bfs_sorted(start_states, max_states, max_depth)
+        elif self.order == "bfs":
+            res = self._bfs_hash(start_states, max_states, max_depth)
+        else:
+            res = self._dfs_hash(start_states, max_states, max_depth)
+        res.seconds = time.perf_counter() - t0
+        return res
+
+    def _bfs_hash(self, start_states: List[State], max_states: Optional[int], max_depth: Optional[int]) -> ExplorationResult:
+        pack = self.packer.pack
+        res = ExplorationResult()
+        seen = set()
+        layer = []
+        for s in start_states:
+            key = pack(s.values())
+            if key not in seen:
+                seen.add(key)
+                layer.append(s)
+        res.starts = len(layer)
+        depth = 0
+        while layer:
+            res.layer_sizes.append(len(layer))
+            res.depth = depth
+            if max_depth is not None and depth >= max_depth:
+                res.truncated = True
+                break
+            nxt = []
+            for s in layer:
+                for s2 in self._expand(s, res) or ():
+                    key = pack(s2.values())
+                    if key not in seen:
+                        if max_states is not None and len(seen) >= max_states:
+                            res.truncated = True
+                            continue
+                        seen.add(key)
+                        nxt.append(s2)
+            layer = nxt
+            depth += 1
+        res.states = len(seen)
+        return res
+
+    def _dfs_hash(self, start_states: List[State], max_states: Optional[int], max_depth: Optional[int]) -> ExplorationResult:
+        pack = self.packer.pack
+        res = ExplorationResult()
+        seen = set()
+        stack = []
+        for s in start_states:
+            key = pack(s.values())
+            if key not in seen:
+                seen.add(key)
+                stack.append((s, 0))
+        res.starts = len(stack)
+        while stack:
+            s, depth = stack.pop()
+            res.depth = max(res.depth, depth)
+            if max_depth is not None and depth >= max_depth:
+                res.truncated = True
+                continue
+            for s2 in self._expand(s, res) or ():
+                key = pack(s2.values())
+                if key not in seen:
+                    if max_states is not None and len(seen) >= max_states:
+                        res.truncated = True
+                        continue
+                    seen.add(key)
+                    stack.append((s2, depth + 1))
+        res.states = len(seen)
+        return res
+
+    def _bfs_sorted(self, start_states: List[State], max_states: Optional[int], max_depth: Optional[int]) -> ExplorationResult:
+        res = ExplorationResult()
+        seen = np.empty(0, dtype=np.uint64)
+        candidates = start_states
+        depth = 0
+        while candidates:
+            # new states of this layer: unique keys not in the sorted visited array
+            keys = self.packer.pack_batch(self.jani.to_matrix(candidates, dtype=np.int64))
+            keys, first = np.unique(keys, return_index=True)
+            new = np.isin(keys, seen, assume_unique=True, invert=True)
+            order = np.argsort(first[new])  # back to generation order
+            keys, first = keys[new][order], first[new][order]
+            if max_states is not None and seen.size + keys.size > max_states:
+                res.truncated = True
+                room = max(0, max_states - seen.size)
+                keys, first = keys[:room], first[:room]
+            if keys.size == 0:
+                break
+            seen = np.union1d(seen, keys)
+            layer = [candidates[i] for i in first]
+            if depth == 0:
+                res.starts = len(layer)
+            res.layer_sizes.append(len(layer))
+            res.depth = depth
+            if max_depth is not None and depth >= max_depth:
+                res.truncated = True
+                break
+            candidates = []
+            for s in layer:
+                candidates.extend(self._expand(s, res) or ())
+            depth += 1
+        res.states = int(seen.size)
+        return res
+
+
+def default_start_states(jani: JANI, n: int = 1000) -> List[State]:
+    """The fixed start pool if the property has one, otherwise n drawn start states."""
+    pool = jani.start_pool()
+    if pool is not None:
+        schema = jani.get_schema()
+        return [State(schema, schema.cast(row)) for row in pool.tolist()]
+    return jani.reset_batch(n)
+
+
+def main(
+    jani_file: str,
+    property_file: str,
+    interface_file: Optional[str] = None,
+    policy_kind: str = "all",
+    sym_model: Optional[str] = None,
+    order: str = "bfs",
+    visited: str = "hash",
+    starts: int = 1000,
+    max_states: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> ExplorationResult:
+    from jani_environment import load_env
+
+    M = load_env(jani_file, property_file, seed=seed)
+    policy: Optional[Policy] = None
+    if policy_kind in ("rrl", "rule-based"):
+        from rrl_policy import RRLPolicy
+        from model_adapter import RRLAdapter
+        if not sym_model or not interface_file:
+            raise ValueError("--sym_model and --interface are required when --policy rrl")
+        adapter = RRLAdapter(var_bounds=M.variables, interface_path=interface_file)
+        policy = RRLPolicy(model_path=sym_model, adapter=adapter, eval_mode="compiled")
+    elif policy_kind != "all":
+        raise ValueError(f"Unknown --policy '{policy_kind}' (use 'all' or 'rrl').")
+
+    explorer = Explorer(M.jani, policy=policy, order=order, visited=visited)
+    res = explorer.run(default_start_states(M.jani, starts), max_states=max_states, max_depth=max_depth)
+    print(
+        f"\n[REACH {policy_kind.upper()} x JANI] starts={res.starts}  states={res.states}  "
+        f"transitions={res.transitions}  depth={res.depth}  goal={res.goal}  unsafe={res.unsafe}  "
+        f"deadlock={res.deadlock}{'  (truncated)' if res.truncated else ''}"
+    )
+    print(
+        f"[reach] {order}/{visited}  key_bits={explorer.packer.bits}  "
+        f"time={res.seconds:.2f}s  states/s={res.states_per_second:.0f}"
+    )
+    return res
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jani", required=True, help="Path to environment .jani (JSON)")
+    ap.add_argument("--property", required=True, help="Path to property .jani (start/goal/failure)")
+    ap.add_argument("--interface", help="Path to interface .jani2nnet (required if --policy rrl)")
+    ap.add_argument(
+        "--policy", choices=["all", "rrl", "rule-based"], default="all",
+        help="Follow every applicable action, or only the one the rule-based policy picks",
+    )
+    ap.add_argument("--sym_model", help="Path to raw symbolic model .JSON (required if --policy rrl)")
+    ap.add_argument("--order", choices=["bfs", "dfs"], default="bfs")
+    ap.add_argument(
+        "--visited", choices=["hash", "sorted"], default="hash",
+        help="Visited set: Python set of packed keys, or sorted uint64 array (BFS only)",
+    )
+    ap.add_argument(
+        "--starts", type=int, default=1000,
+        help="Start states drawn when the property has no fixed start set",
+    )
+    ap.add_argument("--max_states", type=int, default=None)
+    ap.add_argument("--max_depth", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    main(
+        jani_file=args.jani,
+        property_file=args.property,
+        interface_file=args.interface,
+        policy_kind=args.policy,
+        sym_model=args.sym_model,
+        order=args.order,
+        visited=args.visited,
+        starts=args.starts,
+        max_states=args.max_states,
+        max_depth=args.max_depth,
+        seed=args.seed,
+    )
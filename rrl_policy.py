@@ -4,6 +4,8 @@ from __future__ import annotations
 from pathlib import Path as _Path
 from typing import Any, Dict, List, Union
 
+import numpy as np
+
 from symbolic_model import SymbolicModel
 from model_adapter import ModelAdapter
 
@@ -14,17 +16,55 @@ class RRLPolicy:
         model_path: Union[str, _Path],
         adapter: ModelAdapter,
         eval_mode: str = "compiled",  # "lazy" or "compiled"
+        optimize: bool = False,
+        prune_threshold: float = 0.0,
+        use_cache: bool = False,
     ) -> None:
-        self.model = SymbolicModel.load(model_path)
+        if eval_mode not in ("compiled", "lazy"):
+            raise ValueError(f"Unknown eval_mode '{eval_mode}' (use 'compiled' or 'lazy').")
+        self.model = SymbolicModel.load(model_path, optimize=optimize, prune_threshold=prune_threshold,
+                                        use_cache=use_cache)
         self.adapter = adapter
         self.eval_mode = eval_mode
+        # act_batch: interface output k -> its forward_batch column; outputs the model has no
+        # weights for are left out (act never picks them while a scored action is applicable)
+        outputs = range(len(getattr(adapter, "outputs", ())))
+        self._scored = np.array([k for k in outputs if f"class_{k}" in self.model.classes], dtype=np.int64)
+        self._cols = np.array([self.model.classes.index(f"class_{k}") for k in self._scored], dtype=np.int64)
+        # lazy mode: decisions taken and rules computed for them
+        self.lazy_steps = 0
+        self.lazy_rules = 0
+
+    def _forward(self, atoms: Dict[str, bool]) -> Dict[str, float]:
+        # class scores from the fused straight-line function (same values as forward)
+        return self.model.forward_fused(atoms)
 
-    def _forward(self, atoms: Dict[str, bool]):
-        return self.model.forward(atoms)
+    def _act_lazy(self, state: Dict[str, Any], applicable: List[str]) -> str:
+        candidates = {lbl for lbl in self.model.linear_weights if self.adapter.decode(lbl) in applicable}
+        if hasattr(self.adapter, "encode_active"):
+            active = self.adapter.encode_active(state, self.model.atoms)
+            lbl, n_rules = self.model.argmax_lazy(active, candidates, active=True)
+        else:
+            lbl, n_rules = self.model.argmax_lazy(self.adapter.encode(state), candidates)
+        self.lazy_steps += 1
+        self.lazy_rules += n_rules
+
+        if lbl is not None:
+            return self.adapter.decode(lbl)
+        if not applicable:
+            raise RuntimeError("No applicable actions to choose from.")
+        return applicable[0]
 
     def act(self, state: Dict[str, Any], applicable: List[str]) -> str:
-        atoms = self.adapter.encode(state)
-        _, _, scores = self._forward(atoms)
+        if self.eval_mode == "lazy":
+            return self._act_lazy(state, applicable)
+        if hasattr(self.adapter, "encode_active"):
+            # sparse path: only the true atoms, by index into model.atoms
+            active = self.adapter.encode_active(state, self.model.atoms)
+            scores = self.model.forward_fused_active(active)
+        else:
+            atoms = self.adapter.encode(state)
+            scores = self._forward(atoms)
 
         for lbl in sorted(scores, key=scores.get, reverse=True):
             act = self.adapter.decode(lbl)
@@ -34,3 +74,20 @@ class RRLPolicy:
         if not applicable:
             raise RuntimeError("No applicable actions to choose from.")
         return applicable[0]
+
+    def act_batch(self, X: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """
+        Batched act: X is (N, n_inputs) raw inputs in interface order, mask (N, n_outputs)
+        applicability in interface output order. Returns the chosen output index per row
+        (as act, ties go to the lower class). Outputs the model does not score are never
+        picked, unless none of the applicable outputs is scored: then, as in act, the first
+        applicable one is. Rows without applicable output get 0.
+        """
+        logits = self.model.forward_batch(self.adapter.encode_batch(X, self.model.atoms))
+        scores = np.full(mask.shape, -np.inf)
+        scores[:, self._scored] = logits[:, self._cols]
+        scores = np.where(mask, scores, -np.inf)
+        choice = np.argmax(scores, axis=1)
+        unscored = np.isneginf(scores[np.arange(len(choice)), choice])
+        choice[unscored] = np.argmax(mask[unscored], axis=1)
+        return choice
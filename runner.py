@@ -3,9 +3,12 @@ import json
 import random
 from typing import Dict, List, Tuple, Optional, Any
 
-from jani_environment import JaniEnvironment, load_env
+import numpy as np
+
+from jani_environment import JaniEnvironment, VecJaniEnvironment, load_env
 from rrl_policy import RRLPolicy
-from model_adapter import RRLAdapter
+from nn_policy import NNPolicy
+from model_adapter import NNAdapter, RRLAdapter
 
 
 class RandomPolicy:
@@ -26,33 +29,88 @@ def pad_or_trim_trace(trace: List[List[int]], fixed_size: int,
 
 def evaluate_episode(
     M: JaniEnvironment,
-    pi: RandomPolicy | RRLPolicy,
+    pi: RandomPolicy | RRLPolicy | NNPolicy,
     max_steps: int = 1000,
     episode_id: int = 0,
 ) -> Tuple[str, List[List[int]], int]:
-    s = M._sample_init()
-    trace: List[List[int]] = [[int(s_val) for s_val in s.values()]]
+    obs = M.observe(M.reset_state())
+    trace: List[List[int]] = [[int(s_val) for s_val in obs.state.to_vector()]]
 
     for t in range(max_steps):
-        if M.in_goal(s):
+        if obs.goal:
             return "goal", trace, t  # t = number of actions taken so far
-        if M.is_unsafe(s):
+        if obs.unsafe:
             return "unsafe", trace, t
-        applicable = M.applicable_actions(s)
-        if not applicable:
+        if obs.deadlock:
             # no applicable action -> we treat as timeout
             return "timeout", trace, t
 
-        a = pi.act(s, applicable)
-        succs = M.successors(s, a)
-        s2 = random.choice(succs)
-        s = s2
-        trace.append([float(s_val) for s_val in s.values()])
+        # policies read variables by name, which State supports directly
+        a = pi.act(obs.state, [M.actions[i] for i in obs.applicable])
+        obs = M.step(obs.state, M.action_id(a))
+        trace.append([float(s_val) for s_val in obs.state.to_vector()])
 
     # never hit goal/unsafe within max_steps
     return "timeout", trace, max_steps
 
 
+def _policy_inputs(V: VecJaniEnvironment, names: List[str]) -> np.ndarray:
+    """(B, len(names)) policy input matrix: state columns by name, constants broadcast."""
+    schema = V.jani.get_schema()
+    cols = [
+        V.states[:, schema.index[nm]] if nm in schema.index
+        else np.full(V.num_envs, schema.constants[nm])
+        for nm in names
+    ]
+    return np.stack(cols, axis=1)
+
+
+def evaluate_vectorized(
+    V: VecJaniEnvironment,
+    pi: RandomPolicy | RRLPolicy | NNPolicy,
+    episodes: int,
+) -> Dict[str, int]:
+    """
+    Run exactly `episodes` episodes on V.num_envs lockstep copies. Rows that finish start a
+    new episode until all are launched, so every episode is counted once whatever its length.
+    """
+    stats = {"goal": 0, "unsafe": 0, "timeout": 0, "steps_sum": 0}
+    B = V.num_envs
+    V.reset()
+    launched = min(B, episodes)
+    active = np.arange(B) < launched
+    finished = 0
+    while finished < episodes:
+        mask = V.action_mask()
+        counts = mask.sum(axis=1)
+        if isinstance(pi, RandomPolicy):
+            # uniform applicable action per row from one draw
+            pick = np.minimum((V.rng.random(B) * counts).astype(np.int64), np.maximum(counts - 1, 0))
+            actions = np.argmax(np.cumsum(mask, axis=1) > pick[:, None], axis=1)
+        elif hasattr(pi, "act_batch"):
+            # whole batch at once; policy outputs follow the interface output order
+            out_to_action = np.asarray([V.actions.index(o) for o in pi.adapter.outputs])
+            X_in = _policy_inputs(V, pi.adapter.input_names)
+            actions = out_to_action[pi.act_batch(X_in, mask[:, out_to_action])]
+        else:
+            actions = np.argmax(mask, axis=1)  # any applicable action for retired rows
+            for i in np.flatnonzero(active & (counts > 0)).tolist():
+                applicable = [V.actions[a] for a in np.flatnonzero(mask[i]).tolist()]
+                actions[i] = V.actions.index(pi.act(V.state(i), applicable))
+        out = V.step(actions)
+
+        for i in np.flatnonzero(out.done & active).tolist():
+            res = "goal" if out.goal[i] else "unsafe" if out.unsafe[i] else "timeout"
+            stats[res] += 1
+            stats["steps_sum"] += int(out.lengths[i])
+            finished += 1
+            if launched < episodes:
+                launched += 1  # row i was reset and runs the next episode
+            else:
+                active[i] = False
+    return stats
+
+
 def main(
     jani_file: str,
     property_file: str,
@@ -61,12 +119,25 @@ def main(
     max_steps: int = 200,
     policy_kind: str = "random",
     sym_model: Optional[str] = None,
+    eval_mode: str = "compiled",
+    optimize_model: bool = False,
+    prune_weights: float = 0.0,
+    nnet: Optional[str] = None,
+    nn_threads: Optional[int] = None,
     fixed_tsize: int = -1,
+    cache_size: int = 0,
+    use_model_cache: bool = True,
+    start_pool: int = 0,
+    start_pool_workers: Optional[int] = None,
+    num_envs: int = 0,
 ):
-    M = load_env(jani_file, property_file)
+    M = load_env(jani_file, property_file, cache_size=cache_size,
+                 use_model_cache=use_model_cache,
+                 start_pool_size=start_pool,
+                 start_pool_workers=start_pool_workers)
 
     if policy_kind in ("random",):
-        policy: RandomPolicy | RRLPolicy = RandomPolicy()
+        policy: RandomPolicy | RRLPolicy | NNPolicy = RandomPolicy()
     elif policy_kind in ("rrl", "rule-based"):
         if not sym_model:
             raise ValueError("--sym_model is required when --policy rrl")
@@ -74,20 +145,35 @@ def main(
                              interface_path=interface_file)
         policy = RRLPolicy(model_path=sym_model,
                            adapter=adapter,
-                           eval_mode="compiled")
+                           eval_mode=eval_mode,
+                           optimize=optimize_model,
+                           prune_threshold=prune_weights,
+                           use_cache=use_model_cache)
+        if policy.model.optimization_report is not None:
+            print(f"[opt] {policy.model.optimization_report.summary()}")
+    elif policy_kind in ("nn",):
+        nn_adapter = NNAdapter(var_bounds=M.variables,
+                               interface_path=interface_file)
+        policy = NNPolicy(adapter=nn_adapter, model_path=nnet,
+                          threads=nn_threads)
     else:
         raise ValueError(f"Unknown --policy '{policy_kind}' "
-                         "(use 'random' or 'rrl').")
+                         "(use 'random', 'rrl' or 'nn').")
 
     stats = {"goal": 0, "unsafe": 0, "timeout": 0, "steps_sum": 0}
 
     # Open dataset file if we want fixed-size traces
     trace_out = None
-    if fixed_tsize != -1:
+    if num_envs > 0:
+        if fixed_tsize != -1:
+            raise ValueError("--fixed_tsize records per-episode traces; it cannot be combined with --num_envs")
+        V = VecJaniEnvironment(M.jani, num_envs=num_envs, max_steps=max_steps)
+        stats = evaluate_vectorized(V, policy, episodes)
+    elif fixed_tsize != -1:
         trace_out = open("episode_traces.jsonl", "w")
 
     try:
-        for ep in range(episodes):
+        for ep in range(episodes if num_envs <= 0 else 0):
             res, trace, steps = evaluate_episode(
                 M,
                 policy,
@@ -127,6 +213,18 @@ def main(
         f"goal={stats['goal']}  unsafe={stats['unsafe']}  "
         f"timeout={stats['timeout']}  avg_steps={avg_steps:.1f}"
     )
+    if isinstance(policy, RRLPolicy) and policy.eval_mode == "lazy" and policy.lazy_steps:
+        print(
+            f"[lazy] rules/step={policy.lazy_rules / policy.lazy_steps:.1f} "
+            f"of {len(policy.model.rules)}"
+        )
+    if M.cache is not None:
+        cs = M.cache.stats()
+        lookups = max(1, cs["hits"] + cs["misses"])
+        print(
+            f"[cache] hits={cs['hits']}  misses={cs['misses']}  "
+            f"hit_rate={cs['hits'] / lookups:.3f}  size={cs['size']}/{cs['max_size']}"
+        )
 
 
 if __name__ == "__main__":
@@ -146,17 +244,58 @@ if __name__ == "__main__":
     )
     ap.add_argument(
         "--policy",
-        choices=["random", "rrl", "rule-based"],
+        choices=["random", "rrl", "rule-based", "nn"],
         default="random",
-        help="Policy to run: random baseline or rule-based (RRL)",
+        help="Policy to run: random baseline, rule-based (RRL) or the PlaJa network (nn)",
     )
     ap.add_argument(
         "--sym_model",
         help="Path to raw symbolic model .JSON (required if --policy rrl)",
     )
+    ap.add_argument(
+        "--eval_mode", choices=["compiled", "lazy"], default="compiled",
+        help="RRL evaluation: every rule (compiled) or only until the best applicable action is decided (lazy)",
+    )
+    ap.add_argument(
+        "--optimize_model", action="store_true",
+        help="Optimize the symbolic model on load: drop dead rules, merge identical rules",
+    )
+    ap.add_argument(
+        "--prune_weights", type=float, default=0.0,
+        help="Also drop symbolic-model weights with |w| below this (implies --optimize_model)",
+    )
+    ap.add_argument(
+        "--nnet",
+        help="Path to the .nnet network for --policy nn (default: the 'file' named in --interface)",
+    )
+    ap.add_argument(
+        "--nn_threads", type=int, default=None,
+        help="PyTorch intra-op threads for --policy nn (default: PyTorch's choice)",
+    )
     ap.add_argument("--episodes", type=int, default=10)
     ap.add_argument("--max_steps", type=int, default=100)
     ap.add_argument("--fixed_tsize", type=int, default=-1)
+    ap.add_argument(
+        "--cache_size", type=int, default=0,
+        help="Max states in the LRU transition cache (0 disables it)",
+    )
+    ap.add_argument(
+        "--no-cache", dest="use_model_cache", action="store_false",
+        help="Always parse the JANI files and the symbolic model; do not read or write the compiled-model caches",
+    )
+    ap.add_argument(
+        "--start_pool", type=int, default=0,
+        help="Pre-solve this many distinct start states for a states-condition "
+             "start and reuse them from disk on later runs (0 = call Z3 per episode)",
+    )
+    ap.add_argument(
+        "--start_pool_workers", type=int, default=None,
+        help="Worker processes for --start_pool (default: all CPUs)",
+    )
+    ap.add_argument(
+        "--num_envs", type=int, default=0,
+        help="Run episodes as this many lockstep copies on state matrices (0 = one at a time)",
+    )
     args = ap.parse_args()
 
     # If user wants fixed trace size, also bound the rollout length
@@ -171,5 +310,15 @@ if __name__ == "__main__":
         max_steps=args.max_steps,
         policy_kind=args.policy,
         sym_model=args.sym_model,
+        eval_mode=args.eval_mode,
+        optimize_model=args.optimize_model,
+        prune_weights=args.prune_weights,
+        nnet=args.nnet,
+        nn_threads=args.nn_threads,
         fixed_tsize=args.fixed_tsize,
+        cache_size=args.cache_size,
+        use_model_cache=args.use_model_cache,
+        start_pool=args.start_pool,
+        start_pool_workers=args.start_pool_workers,
+        num_envs=args.num_envs,
     )
@@ -3,12 +3,25 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
+import keyword
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Tuple, Union
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple, Union
+
+import numpy as np
 
 Json = Dict[str, Any]
 
+# rows per forward_batch chunk; a transposed chunk stays cache-resident
+_BATCH_CHUNK = 8192
+
 
 class SymbolicModel:
     def __init__(
@@ -21,6 +34,12 @@ class SymbolicModel:
         compiled_funcs: Dict[str, Callable[[Dict[str, bool], Dict[str, bool]], bool]],
         compiled_src_per_rule: Dict[str, str],
         compiled_module_src: str,
+        sparse_funcs: Optional[Dict[str, Callable[[Collection[int], Dict[str, bool]], bool]]] = None,
+        fused_funcs: Optional[Tuple[Callable[[Dict[str, bool]], Dict[str, float]],
+                                    Callable[[Collection[int]], Dict[str, float]]]] = None,
+        fused_src: Optional[str] = None,
+        sparse_src: Optional[str] = None,
+        dense_weights: Optional[Tuple[np.ndarray, np.ndarray]] = None,
     ) -> None:
         self.atoms = atoms
         self.rules = rules
@@ -31,13 +50,88 @@ class SymbolicModel:
         self._compiled_funcs = compiled_funcs
         self._compiled_src_per_rule = compiled_src_per_rule
         self._compiled_module_src = compiled_module_src
+        self.optimization_report: Optional[OptimizationReport] = None
+        # same rules over the set of indices (into atoms) of the true atoms
+        if sparse_funcs is None or sparse_src is None:
+            sparse_funcs, _, sparse_src = _compile_rule_funcs_with_src(
+                rules, atom_index={a: j for j, a in enumerate(atoms)}
+            )
+        self._sparse_funcs = sparse_funcs
+        self._sparse_module_src = sparse_src
+        # whole model as one straight-line function (dict input / active-set input)
+        if fused_funcs is None or fused_src is None:
+            fused_funcs, fused_src = _compile_fused_forward_with_src(
+                atoms, rules, topo_layers, linear_weights, linear_bias
+            )
+        self._fused_forward, self._fused_forward_active = fused_funcs
+        self._fused_src = fused_src
+
+        # lazy argmax: last-layer rules by decreasing weight spread across classes, with
+        # their weights per class (weights order); score bounds start from bias + the
+        # unknown-rule range
+        self._lazy_classes: List[str] = list(linear_weights)
+        self._lazy_last = set(topo_layers[-1]) if topo_layers else set()
+        self._lazy_order: List[Tuple[str, List[float]]] = []
+        for rname in (topo_layers[-1] if topo_layers else []):
+            ws = [float(linear_weights[c].get(rname, 0.0)) for c in self._lazy_classes]
+            if any(w != 0.0 for w in ws):
+                self._lazy_order.append((rname, ws))
+        self._lazy_order.sort(key=lambda rw: -(max(rw[1]) - min(rw[1])))
+        n_cls = len(self._lazy_classes)
+        bias_vec = [float(linear_bias.get(c, 0.0)) for c in self._lazy_classes]
+        self._lazy_lo = [bias_vec[c] + sum(min(w[c], 0.0) for _, w in self._lazy_order) for c in range(n_cls)]
+        self._lazy_hi = [bias_vec[c] + sum(max(w[c], 0.0) for _, w in self._lazy_order) for c in range(n_cls)]
+        self._lazy_plans: Dict[Tuple[int, ...], Tuple[List[Tuple[str, Tuple[float, ...]]], List[float], List[float]]] = {}
+        # bounds are summed in another order than forward's scores: only trust clear gaps
+        self._lazy_eps = 1e-9 * (1.0 + max((sum(abs(w[c]) for _, w in self._lazy_order) + abs(bias_vec[c])
+                                             for c in range(n_cls)), default=0.0))
+
+        # batch path: one vectorized evaluator per rule, last layer -> classes as a matmul
+        atom_index = {a: j for j, a in enumerate(atoms)}
+        self._batch_funcs = {r: _batch_fn(rules[r], atom_index) for r in rules}
+        self.classes: List[str] = sorted(linear_weights, key=_class_index_key)
+        if dense_weights is None:
+            last_layer = topo_layers[-1] if topo_layers else []
+            W = np.zeros((len(last_layer), len(self.classes)))
+            for c, clazz in enumerate(self.classes):
+                for r, feat in enumerate(last_layer):
+                    W[r, c] = float(linear_weights[clazz].get(feat, 0.0))
+            dense_weights = (W, np.array([float(linear_bias.get(c, 0.0)) for c in self.classes]))
+        self._W, self._b = dense_weights
 
     # ----------------------------------------------------------------------
     # Loading
     # ----------------------------------------------------------------------
     @classmethod
-    def load(cls, path: Union[str, Path]) -> "SymbolicModel":
-        obj: Json = json.loads(Path(path).read_text())
+    def load(
+        cls,
+        path: Union[str, Path],
+        *,
+        optimize: bool = False,
+        prune_threshold: float = 0.0,
+        verify_npz: Optional[Union[str, Path]] = None,
+        cache_dir: Optional[Union[str, Path]] = None,
+        use_cache: bool = False,
+    ) -> "SymbolicModel":
+        """
+        Load and compile a model. With optimize (implied by prune_threshold > 0) the rules
+        go through optimize_rules first and the model's optimization_report is set; with
+        verify_npz, the optimized model must pick the same argmax as the original one on
+        every row of the npz atom matrix `X`, or ValueError is raised.
+        With use_cache, the compiled model is reused from `cache_dir` when one exists for
+        the same JSON and options (see _load_cached); a cache miss compiles and writes the
+        entry, and an unwritable cache directory only costs the reuse. Off by default.
+        """
+        raw = Path(path).read_bytes()
+        options = (bool(optimize or prune_threshold > 0.0), float(prune_threshold))
+        model = cls._load_cached(raw, options, cache_dir) if use_cache else cls._build(raw, *options)
+        if model.optimization_report is not None and verify_npz is not None:
+            model._verify_against(cls._build(raw, False, 0.0), verify_npz)
+        return model
+
+    @classmethod
+    def _build(cls, raw: bytes, optimize: bool, prune_threshold: float) -> "SymbolicModel":
+        obj: Json = json.loads(raw)
 
         atoms = list(obj.get("atoms", []))
         if not atoms:
@@ -53,10 +147,14 @@ class SymbolicModel:
         if not weights or not bias:
             raise ValueError("Model is missing 'linear.weights' or 'linear.bias'.")
 
+        report: Optional[OptimizationReport] = None
+        if optimize:
+            rules, weights, report = optimize_rules(atoms, rules, weights, prune_threshold)
+
         topo_layers = _build_topo_layers(rules)
         funcs, src_per_rule, module_src = _compile_rule_funcs_with_src(rules)
 
-        return cls(
+        model = cls(
             atoms=atoms,
             rules=rules,
             linear_weights=weights,
@@ -66,6 +164,133 @@ class SymbolicModel:
             compiled_src_per_rule=src_per_rule,
             compiled_module_src=module_src,
         )
+        model.optimization_report = report
+        return model
+
+    def _verify_against(self, reference: "SymbolicModel", npz: Union[str, Path]) -> None:
+        """Fill in the report's agreement with `reference` on the npz atom matrix; raise unless 100%."""
+        with np.load(npz) as D:
+            X = D["X"] == 1.0
+        same = np.argmax(self.forward_batch(X), axis=1) == np.argmax(reference.forward_batch(X), axis=1)
+        report = self.optimization_report
+        report.verified_samples = int(X.shape[0])
+        report.agreement = float(same.mean()) if X.shape[0] else 1.0
+        if not same.all():
+            raise ValueError(f"Optimized model changes {int((~same).sum())} predictions on {npz}: {report.summary()}")
+
+    # ---------- compiled-model cache ----------
+    # Bump when the cached layout changes. The key also covers the JSON content, the load
+    # options, the source of this module (the compiler) and the Python version, which
+    # marshal'd code objects depend on.
+    CACHE_VERSION = 1
+
+    @staticmethod
+    def default_cache_dir() -> Path:
+        root = os.environ.get("MICROPLAJA_CACHE_DIR")
+        return Path(root) if root else Path.home() / ".cache" / "microplaja"
+
+    @staticmethod
+    def _cache_key(raw: bytes, options: tuple) -> str:
+        h = hashlib.sha256()
+        h.update(f"v{SymbolicModel.CACHE_VERSION}|py{sys.version_info[0]}.{sys.version_info[1]}|{options!r}".encode())
+        h.update(Path(__file__).read_bytes())
+        h.update(b"|")
+        h.update(raw)
+        return h.hexdigest()[:32]
+
+    @classmethod
+    def _load_cached(cls, raw: bytes, options: tuple, cache_dir: Optional[Union[str, Path]]) -> "SymbolicModel":
+        """
+        An entry holds the (optimized) model as `model.json`, the generated sources as
+        `source.json`, their code objects as `code.marshal` and the dense last-layer
+        weights as `weights.npz`; a hit runs the code objects instead of generating and
+        compiling source.
+        """
+        key = cls._cache_key(raw, options)
+        try:
+            entry = Path(cache_dir if cache_dir is not None else cls.default_cache_dir()) / "symbolic" / key
+        except RuntimeError as exc:  # no home directory to put the default cache in
+            print(f"Warning: symbolic model cache disabled: {exc}")
+            return cls._build(raw, *options)
+
+        if (entry / "code.marshal").exists():
+            try:
+                return cls._read_cache(entry)
+            except Exception as exc:  # stale or corrupt entry: rebuild it
+                print(f"Warning: ignoring unreadable symbolic model cache {entry}: {exc}")
+                shutil.rmtree(entry, ignore_errors=True)
+
+        model = cls._build(raw, *options)
+        tmp = None
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = Path(tempfile.mkdtemp(dir=entry.parent, prefix=f".{key}."))
+            model._write_cache(tmp)
+            if entry.exists():  # written concurrently by another process
+                shutil.rmtree(tmp, ignore_errors=True)
+            else:
+                os.replace(tmp, entry)
+        except OSError as exc:
+            print(f"Warning: could not write symbolic model cache {entry}: {exc}")
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+        return model
+
+    def _write_cache(self, entry: Path) -> None:
+        report = self.optimization_report
+        (entry / "model.json").write_text(json.dumps({
+            "atoms": self.atoms,
+            "rules": self.rules,
+            "weights": self.linear_weights,
+            "bias": self.linear_bias,
+            "topo_layers": self.topo_layers,
+            "report": asdict(report) if report is not None else None,
+        }))
+        sources = {
+            "module": self._compiled_module_src,
+            "per_rule": self._compiled_src_per_rule,
+            "sparse": self._sparse_module_src,
+            "fused": self._fused_src,
+        }
+        (entry / "source.json").write_text(json.dumps(sources))
+        codes = [compile(sources[k], f"<symbolic_model:{k}>", "exec") for k in ("module", "sparse", "fused")]
+        (entry / "code.marshal").write_bytes(marshal.dumps(codes))
+        np.savez(entry / "weights.npz", W=self._W, b=self._b)
+
+    @classmethod
+    def _read_cache(cls, entry: Path) -> "SymbolicModel":
+        meta = json.loads((entry / "model.json").read_text())
+        sources = json.loads((entry / "source.json").read_text())
+        dense_code, sparse_code, fused_code = marshal.loads((entry / "code.marshal").read_bytes())
+        with np.load(entry / "weights.npz") as D:
+            dense_weights = (D["W"], D["b"])
+
+        rules = meta["rules"]
+        dense_env: Dict[str, Any] = {}
+        sparse_env: Dict[str, Any] = {}
+        fused_env: Dict[str, Any] = {}
+        exec(dense_code, dense_env, dense_env)
+        exec(sparse_code, sparse_env, sparse_env)
+        exec(fused_code, fused_env, fused_env)
+
+        model = cls(
+            atoms=meta["atoms"],
+            rules=rules,
+            linear_weights=meta["weights"],
+            linear_bias=meta["bias"],
+            topo_layers=meta["topo_layers"],
+            compiled_funcs={r: dense_env[f"_rule_{r}"] for r in rules},
+            compiled_src_per_rule=sources["per_rule"],
+            compiled_module_src=sources["module"],
+            sparse_funcs={r: sparse_env[f"_rule_{r}"] for r in rules},
+            fused_funcs=(fused_env["_forward"], fused_env["_forward_active"]),
+            fused_src=sources["fused"],
+            sparse_src=sources["sparse"],
+            dense_weights=dense_weights,
+        )
+        if meta["report"] is not None:
+            model.optimization_report = OptimizationReport(**meta["report"])
+        return model
 
     # ----------------------------------------------------------------------
     # Evaluation (compiled)
@@ -94,10 +319,139 @@ class SymbolicModel:
         class_scores = _linear_scores(last_vals, self.linear_weights, self.linear_bias)
         return rule_values, last_vals, class_scores
 
+    def forward_active(
+        self, active: Collection[int]
+    ) -> Tuple[Dict[str, bool], Dict[str, bool], Dict[str, float]]:
+        """
+        Same as forward, for an input given as the indices (into self.atoms) of the true
+        atoms, e.g. from RRLAdapter.encode_active; every other atom is false.
+        """
+        if not isinstance(active, (set, frozenset)):
+            active = set(active)
+        rule_values: Dict[str, bool] = {}
+        last_layer: List[str] = []
+
+        for layer in self.topo_layers:
+            last_layer = layer
+            for rname in layer:
+                rule_values[rname] = self._sparse_funcs[rname](active, rule_values)
+
+        last_vals = {name: bool(rule_values.get(name, False)) for name in last_layer}
+        class_scores = _linear_scores(last_vals, self.linear_weights, self.linear_bias)
+        return rule_values, last_vals, class_scores
+
+    def forward_fused(self, atom_values: Dict[str, bool]) -> Dict[str, float]:
+        """
+        class_scores of forward from the fused function: only rules that feed a nonzero
+        last-layer weight are computed, and atoms are not validated up front (a missing
+        atom that is needed raises KeyError).
+        """
+        return self._fused_forward(atom_values)
+
+    def forward_fused_active(self, active: Collection[int]) -> Dict[str, float]:
+        """forward_fused for the indices of the true atoms, as forward_active."""
+        if not isinstance(active, (set, frozenset)):
+            active = set(active)
+        return self._fused_forward_active(active)
+
+    def _lazy_plan(self, cand: Tuple[int, ...]):
+        """Rule order and initial bounds of argmax_lazy, restricted to the candidate classes."""
+        order = [(rname, tuple(ws[c] for c in cand)) for rname, ws in self._lazy_order]
+        order = [(rname, ws) for rname, ws in order if any(w != 0.0 for w in ws)]
+        return order, [self._lazy_lo[c] for c in cand], [self._lazy_hi[c] for c in cand]
+
+    def argmax_lazy(
+        self,
+        inputs: Union[Dict[str, bool], Collection[int]],
+        candidates: Collection[str],
+        *,
+        active: bool = False,
+    ) -> Tuple[Optional[str], int]:
+        """
+        The class among `candidates` with the highest forward score (ties: first in
+        linear.weights order), evaluating as few rules as possible. Last-layer rules are
+        computed by decreasing weight impact, each on demand with only the rules it
+        references; per-class score bounds are narrowed after each, and the search stops
+        once one candidate's lower bound clears every other's upper bound. `inputs` is
+        an atom dict, or with active=True the indices of the true atoms.
+        Returns (class or None if no candidate is a class, number of rules computed).
+        """
+        cand = tuple(c for c, clazz in enumerate(self._lazy_classes) if clazz in candidates)
+        if len(cand) <= 1:
+            return (self._lazy_classes[cand[0]] if cand else None), 0
+
+        if active:
+            if not isinstance(inputs, (set, frozenset)):
+                inputs = set(inputs)
+            R = _LazyRules(self._sparse_funcs, inputs)
+        else:
+            R = _LazyRules(self._compiled_funcs, inputs)
+
+        plan = self._lazy_plans.get(cand)
+        if plan is None:
+            plan = self._lazy_plans[cand] = self._lazy_plan(cand)
+        order, lo, hi = plan[0], list(plan[1]), list(plan[2])
+        eps = self._lazy_eps
+        others = range(len(cand))
+        for rname, ws in order:
+            if R[rname]:
+                for i, w in enumerate(ws):
+                    if w > 0.0:
+                        lo[i] += w
+                    else:
+                        hi[i] += w
+            else:
+                for i, w in enumerate(ws):
+                    if w > 0.0:
+                        hi[i] -= w
+                    else:
+                        lo[i] -= w
+            best = lo.index(max(lo))
+            bound = lo[best] - eps
+            if all(hi[i] < bound for i in others if i != best):
+                return self._lazy_classes[cand[best]], len(R)
+
+        # every relevant rule is known: exact scores, summed as forward does
+        best_c, best_score = cand[0], None
+        for c in cand:
+            clazz = self._lazy_classes[c]
+            score = float(self.linear_bias.get(clazz, 0.0))
+            for feat, w in self.linear_weights[clazz].items():
+                if w != 0.0 and feat in self._lazy_last and R[feat]:
+                    score += w
+            if best_score is None or score > best_score:
+                best_c, best_score = c, score
+        return self._lazy_classes[best_c], len(R)
+
+    def forward_batch(self, X_bool: np.ndarray) -> np.ndarray:
+        """
+        Evaluate N inputs at once. X_bool is (N, n_atoms), columns in self.atoms order
+        (e.g. RRLAdapter.encode_batch). Returns the (N, n_classes) logits, column k being
+        self.classes[k] ("class_k"); row i equals forward's class_scores for row i.
+        """
+        X = np.asarray(X_bool, dtype=bool)
+        if X.ndim != 2 or X.shape[1] != len(self.atoms):
+            raise ValueError(f"Expected an (N, {len(self.atoms)}) matrix, got shape {X.shape}")
+
+        last_layer = self.topo_layers[-1] if self.topo_layers else []
+        H = np.empty((X.shape[0], len(last_layer)))
+        for start in range(0, X.shape[0], _BATCH_CHUNK):
+            # atom-major chunk: each atom's column is one contiguous row
+            XT = np.ascontiguousarray(X[start:start + _BATCH_CHUNK].T)
+            R: Dict[str, np.ndarray] = {}
+            for layer in self.topo_layers:
+                for rname in layer:
+                    R[rname] = np.broadcast_to(self._batch_funcs[rname](XT, R), (XT.shape[1],))
+            for j, rname in enumerate(last_layer):
+                H[start:start + XT.shape[1], j] = R[rname]
+        return H @ self._W + self._b
+
     # ----------------------------------------------------------------------
     # Introspection
     # ----------------------------------------------------------------------
-    def compiled_source(self, rule_name: str | None = None, *, module: bool = False) -> str:
+    def compiled_source(self, rule_name: str | None = None, *, module: bool = False, fused: bool = False) -> str:
+        if fused:
+            return self._fused_src
         if module:
             return self._compiled_module_src
         if rule_name is None:
@@ -113,6 +467,134 @@ class SymbolicModel:
         Path(path).write_text(text)
 
 
+# ----------------------------------------------------------------------
+# Optimization: rules + weights -> smaller equivalent rules + weights
+# ----------------------------------------------------------------------
+@dataclass
+class OptimizationReport:
+    rules_before: int
+    rules_after: int
+    dead_rules: int           # not reachable from a weighted last-layer rule
+    merged_rules: int         # structurally identical to an earlier rule of the same layer
+    weights_before: int
+    weights_after: int
+    pruned_weights: int       # |w| below prune_threshold (or 0, or not on a last-layer rule)
+    prune_threshold: float
+    agreement: Optional[float] = None   # argmax agreement with the original model (verify_npz)
+    verified_samples: int = 0
+
+    def summary(self) -> str:
+        out = (
+            f"rules {self.rules_before} -> {self.rules_after} "
+            f"(dead={self.dead_rules}, merged={self.merged_rules}); "
+            f"weights {self.weights_before} -> {self.weights_after} "
+            f"(pruned={self.pruned_weights}, threshold={self.prune_threshold:g})"
+        )
+        if self.agreement is not None:
+            out += f"; agreement={self.agreement:.4f} on {self.verified_samples} samples"
+        return out
+
+
+def optimize_rules(
+    atoms: List[str],
+    rules: Dict[str, Any],
+    weights: Dict[str, Dict[str, float]],
+    prune_threshold: float = 0.0,
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, float]], OptimizationReport]:
+    """
+    Smaller rules/weights for the same model, without touching the inputs:
+      - expressions are canonicalized (AND/OR terms deduplicated and sorted, one-term
+        AND/OR unwrapped) and structurally identical rules of a layer are merged into the
+        first one; references are redirected, and merged last-layer weights are summed.
+        Only whole rules are merged: a subexpression shared by different rules is still
+        evaluated once per rule;
+      - weights on rules outside the last layer (forward ignores them), zero weights and,
+        with prune_threshold, weights with |w| < prune_threshold are dropped;
+      - rules not reachable from a remaining weight are dropped.
+    Without pruning or last-layer merges, class scores are unchanged.
+    """
+    layers = _build_topo_layers(rules)
+    last = set(layers[-1]) if layers else set()
+    atom_set = set(atoms)
+    n_weights = sum(len(w) for w in weights.values())
+
+    rename: Dict[str, str] = {}
+    canon: Dict[str, Any] = {}
+    merged = 0
+    for layer in layers:
+        seen: Dict[str, str] = {}
+        for rname in layer:
+            expr = _canonical_expr(rules[rname], rename)
+            key = json.dumps(expr, sort_keys=True)
+            if key in seen:
+                rename[rname] = seen[key]
+                merged += 1
+            else:
+                seen[key] = rname
+                canon[rname] = expr
+
+    new_weights: Dict[str, Dict[str, float]] = {}
+    for clazz, wmap in weights.items():
+        merged_w: Dict[str, float] = {}
+        for feat, w in wmap.items():
+            if feat not in last:
+                continue
+            feat = rename.get(feat, feat)
+            merged_w[feat] = merged_w.get(feat, 0.0) + float(w)
+        new_weights[clazz] = {
+            f: w for f, w in merged_w.items() if w != 0.0 and abs(w) >= prune_threshold
+        }
+
+    # live rules: weighted last-layer rules and everything they reference; the last layer
+    # must stay the last layer, so keep it whole if nothing in it is weighted
+    roots = [f for wmap in new_weights.values() for f in wmap]
+    if not roots:
+        roots = [r for r in canon if r in last]
+    live: set = set()
+    stack = list(roots)
+    while stack:
+        rname = stack.pop()
+        if rname not in live:
+            live.add(rname)
+            stack.extend(_rule_deps(canon[rname], atom_set))
+    new_rules = {r: e for r, e in canon.items() if r in live}
+
+    report = OptimizationReport(
+        rules_before=len(rules),
+        rules_after=len(new_rules),
+        dead_rules=len(canon) - len(new_rules),
+        merged_rules=merged,
+        weights_before=n_weights,
+        weights_after=sum(len(w) for w in new_weights.values()),
+        pruned_weights=n_weights - sum(len(w) for w in new_weights.values()),
+        prune_threshold=prune_threshold,
+    )
+    return new_rules, new_weights, report
+
+
+def _canonical_expr(node: Any, rename: Dict[str, str]) -> Any:
+    if isinstance(node, str):
+        return rename.get(node, node)
+    if not isinstance(node, dict):
+        return node
+    if "ref" in node:
+        out = dict(node)
+        out["ref"] = rename.get(str(node["ref"]), str(node["ref"]))
+        return out
+    if "NOT" in node:
+        return {"NOT": _canonical_expr(node["NOT"], rename)}
+    for op in ("AND", "OR"):
+        if op in node and isinstance(node[op], list):
+            terms: Dict[str, Any] = {}
+            for t in node[op]:
+                t = _canonical_expr(t, rename)
+                terms.setdefault(json.dumps(t, sort_keys=True), t)
+            if len(terms) == 1:
+                return next(iter(terms.values()))
+            return {op: [terms[k] for k in sorted(terms)]}
+    return node
+
+
 # ----------------------------------------------------------------------
 # Helpers
 # ----------------------------------------------------------------------
@@ -137,6 +619,23 @@ def _linear_scores(
     return class_scores
 
 
+class _LazyRules(dict):
+    """rule -> bool, computing (and memoizing) a rule the first time it is read."""
+    def __init__(self, funcs: Dict[str, Callable[[Any, Dict[str, bool]], bool]], A: Any) -> None:
+        super().__init__()
+        self._funcs = funcs
+        self._A = A
+
+    def __missing__(self, rname: str) -> bool:
+        v = self[rname] = self._funcs[rname](self._A, self)
+        return v
+
+
+def _class_index_key(clazz: str) -> Tuple[int, str]:
+    _, _, idx = clazz.rpartition("_")
+    return (int(idx), clazz) if idx.isdigit() else (1 << 30, clazz)
+
+
 def _extract_layer_index(rule_name: str) -> int:
     if not rule_name.startswith("L"):
         raise ValueError(f"Rule name '{rule_name}' must start with 'L'.")
@@ -164,10 +663,25 @@ def _build_topo_layers(rules: Dict[str, Any]) -> List[List[str]]:
 # ----------------------------------------------------------------------
 # Compilation: expr -> Python code -> functions
 # ----------------------------------------------------------------------
-def _expr_to_py(node: Any) -> str:
+def _expr_to_py(
+    node: Any,
+    atom_index: Optional[Dict[str, int]] = None,
+    atom_sets: Optional[List[frozenset]] = None,
+) -> str:
+    """
+    Python source of a rule expression over A (atom -> bool) and R (rule -> bool). With
+    atom_index, atoms are tested by index as `j in A`, A being the set of true atoms;
+    with atom_sets too, the atoms of an AND/OR are tested together as one set operation
+    against a module constant `_S{k}` (atom_sets[k]).
+    """
     if isinstance(node, bool):
         return "True" if node else "False"
 
+    if isinstance(node, str) and atom_index is not None:
+        if node in atom_index:
+            return f"({atom_index[node]} in A)"
+        return f"R[{node!r}]"
+
     if isinstance(node, str):
         # Atom if present in A, otherwise it MUST be a rule already computed in R.
         # If it's missing from R, this raises KeyError -> signals wrong order or missing rule.
@@ -183,7 +697,7 @@ def _expr_to_py(node: Any) -> str:
         return f"R[{ref!r}]"
 
     if "NOT" in node:
-        inner = _expr_to_py(node["NOT"])
+        inner = _expr_to_py(node["NOT"], atom_index, atom_sets)
         return f"(not ({inner}))"
 
     if "AND" in node:
@@ -192,7 +706,7 @@ def _expr_to_py(node: Any) -> str:
             raise ValueError("AND expects a list.")
         if not terms:
             return "True"
-        return "(" + " and ".join(_expr_to_py(t) for t in terms) + ")"
+        return "(" + " and ".join(_grouped_terms(terms, atom_index, atom_sets, "AND")) + ")"
 
     if "OR" in node:
         terms = node["OR"]
@@ -200,13 +714,32 @@ def _expr_to_py(node: Any) -> str:
             raise ValueError("OR expects a list.")
         if not terms:
             return "False"
-        return "(" + " or ".join(_expr_to_py(t) for t in terms) + ")"
+        return "(" + " or ".join(_grouped_terms(terms, atom_index, atom_sets, "OR")) + ")"
 
     raise ValueError(f"Unknown expr form: {node!r}")
 
 
+def _grouped_terms(
+    terms: List[Any],
+    atom_index: Optional[Dict[str, int]],
+    atom_sets: Optional[List[frozenset]],
+    op: str,
+) -> List[str]:
+    """Sources of the AND/OR terms; with atom_sets, two or more atoms become one set test."""
+    if atom_sets is None or atom_index is None:
+        return [_expr_to_py(t, atom_index, atom_sets) for t in terms]
+    atom_terms = [t for t in terms if isinstance(t, str) and t in atom_index]
+    if len(atom_terms) < 2:
+        return [_expr_to_py(t, atom_index, atom_sets) for t in terms]
+    k = len(atom_sets)
+    atom_sets.append(frozenset(atom_index[t] for t in atom_terms))
+    head = f"(_S{k} <= A)" if op == "AND" else f"(not A.isdisjoint(_S{k}))"
+    return [head] + [_expr_to_py(t, atom_index, atom_sets) for t in terms if not (isinstance(t, str) and t in atom_index)]
+
+
 def _compile_rule_funcs_with_src(
     rules: Dict[str, Any],
+    atom_index: Optional[Dict[str, int]] = None,
 ) -> Tuple[
     Dict[str, Callable[[Dict[str, bool], Dict[str, bool]], bool]],
     Dict[str, str],
@@ -215,6 +748,7 @@ def _compile_rule_funcs_with_src(
     env: Dict[str, Any] = {}
     per_rule_src: Dict[str, str] = {}
     code_lines: List[str] = []
+    atom_sets: Optional[List[frozenset]] = [] if atom_index is not None else None
 
     def _sort_key(name: str) -> Tuple[int, int, str]:
         L = _extract_layer_index(name)
@@ -223,12 +757,15 @@ def _compile_rule_funcs_with_src(
 
     for rname in sorted(rules.keys(), key=_sort_key):
         rexpr = rules[rname]
-        py_expr = _expr_to_py(rexpr)
+        py_expr = _expr_to_py(rexpr, atom_index, atom_sets)
         fn_name = f"_rule_{rname}"
         src = f"def {fn_name}(A, R):\n    return bool({py_expr})\n"
         per_rule_src[rname] = src
         code_lines.append(src)
 
+    if atom_sets:
+        consts = [f"_S{k} = frozenset({sorted(S)!r})" for k, S in enumerate(atom_sets)]
+        code_lines.insert(0, "\n".join(consts) + "\n")
     module_src = "\n".join(code_lines)
     exec(module_src, env, env)
 
@@ -237,3 +774,171 @@ def _compile_rule_funcs_with_src(
         funcs[rname] = env[f"_rule_{rname}"]
 
     return funcs, per_rule_src, module_src
+
+
+def _rule_deps(node: Any, atoms: Collection[str]) -> List[str]:
+    """Rules referenced by an expression (strings that are not atoms, and refs)."""
+    if isinstance(node, str):
+        return [] if node in atoms else [node]
+    if not isinstance(node, dict):
+        return []
+    if "ref" in node:
+        return [str(node["ref"])]
+    if "NOT" in node:
+        return _rule_deps(node["NOT"], atoms)
+    out: List[str] = []
+    for t in node.get("AND", node.get("OR", [])):
+        out.extend(_rule_deps(t, atoms))
+    return out
+
+
+def _atom_refs(node: Any, atom_index: Dict[str, int]) -> List[str]:
+    """Atoms referenced directly by an expression."""
+    if isinstance(node, str):
+        return [node] if node in atom_index else []
+    if not isinstance(node, dict) or "ref" in node:
+        return []
+    if "NOT" in node:
+        return _atom_refs(node["NOT"], atom_index)
+    out: List[str] = []
+    for t in node.get("AND", node.get("OR", [])):
+        out.extend(_atom_refs(t, atom_index))
+    return out
+
+
+def _expr_to_local_py(node: Any, names: Dict[str, str]) -> str:
+    """Python source of a rule expression whose atoms and rules are locals (names)."""
+    if isinstance(node, bool):
+        return "True" if node else "False"
+    if isinstance(node, str):
+        return names[node]
+    if not isinstance(node, dict):
+        raise ValueError(f"Invalid expr node: {node!r}")
+    if "ref" in node:
+        ref = names[str(node["ref"])]
+        return f"(not {ref})" if node.get("neg") else ref
+    if "NOT" in node:
+        return f"(not ({_expr_to_local_py(node['NOT'], names)}))"
+    for op, empty in (("AND", "True"), ("OR", "False")):
+        if op in node:
+            terms = node[op]
+            if not isinstance(terms, list):
+                raise ValueError(f"{op} expects a list.")
+            if not terms:
+                return empty
+            return "(" + f" {op.lower()} ".join(_expr_to_local_py(t, names) for t in terms) + ")"
+    raise ValueError(f"Unknown expr form: {node!r}")
+
+
+def _compile_fused_forward_with_src(
+    atoms: List[str],
+    rules: Dict[str, Any],
+    topo_layers: List[List[str]],
+    weights: Dict[str, Dict[str, float]],
+    bias: Dict[str, float],
+) -> Tuple[Tuple[Callable[[Dict[str, bool]], Dict[str, float]],
+                 Callable[[Collection[int]], Dict[str, float]]], str]:
+    """
+    One straight-line function per input form, returning forward's class_scores:
+    `_forward(A)` over atom -> bool and `_forward_active(A)` over the set of true atom
+    indices. Needed atoms are bound to locals once, rules feeding a nonzero last-layer
+    weight are computed in topological order as locals, and each class score adds its
+    weights in forward's order (skipped terms add exactly 0.0).
+    """
+    atom_index = {a: j for j, a in enumerate(atoms)}
+    last_layer = set(topo_layers[-1]) if topo_layers else set()
+
+    # rules to compute: nonzero last-layer features and everything they reference
+    needed: set = set()
+    stack = [f for wmap in weights.values() for f, w in wmap.items() if f in last_layer and w != 0.0]
+    while stack:
+        r = stack.pop()
+        if r not in needed:
+            needed.add(r)
+            stack.extend(_rule_deps(rules[r], atom_index))
+    order = [r for layer in topo_layers for r in layer if r in needed]
+
+    names: Dict[str, str] = {}
+    used_atoms = sorted(
+        {atom_index[a] for r in order for a in _atom_refs(rules[r], atom_index)}
+    )
+    for j in used_atoms:
+        names[atoms[j]] = f"a{j}"
+    for k, r in enumerate(order):
+        names[r] = r if r.isidentifier() and not keyword.iskeyword(r) and r not in ("A", "bool") else f"r{k}"
+
+    body: List[str] = []
+    for r in order:
+        body.append(f"    {names[r]} = bool({_expr_to_local_py(rules[r], names)})")
+    scores: List[str] = []
+    for c, (clazz, wmap) in enumerate(weights.items()):
+        body.append(f"    c{c} = {float(bias.get(clazz, 0.0))!r}")
+        for feat, w in wmap.items():
+            if feat in last_layer and feat in needed and w != 0.0:
+                body.append(f"    if {names[feat]}: c{c} += {float(w)!r}")
+        scores.append(f"{clazz!r}: c{c}")
+    tail = body + ["    return {" + ", ".join(scores) + "}"]
+
+    src = "\n".join(
+        ["def _forward(A):"] + [f"    a{j} = A[{atoms[j]!r}]" for j in used_atoms] + tail
+        + ["", "", "def _forward_active(A):"] + [f"    a{j} = {j} in A" for j in used_atoms] + tail
+    ) + "\n"
+    env: Dict[str, Any] = {}
+    exec(src, env, env)
+    return (env["_forward"], env["_forward_active"]), src
+
+
+# ----------------------------------------------------------------------
+# Compilation: expr -> vectorized evaluator over a batch
+# ----------------------------------------------------------------------
+BatchFn = Callable[[np.ndarray, Dict[str, np.ndarray]], Any]
+
+
+def _batch_fn(node: Any, atom_index: Dict[str, int]) -> BatchFn:
+    """
+    Evaluator of a rule expression over XT (n_atoms, N bool, atom-major) and R (rule ->
+    (N,) bool). AND/OR over plain atoms become a single all/any reduction over their
+    atom indices.
+    """
+    if isinstance(node, bool):
+        return lambda X, R: node
+
+    if isinstance(node, str):
+        if node in atom_index:
+            j = atom_index[node]
+            return lambda X, R: X[j]
+        return lambda X, R: R[node]
+
+    if not isinstance(node, dict):
+        raise ValueError(f"Invalid expr node: {node!r}")
+
+    if "ref" in node:
+        ref = str(node["ref"])
+        if node.get("neg"):
+            return lambda X, R: ~R[ref]
+        return lambda X, R: R[ref]
+
+    if "NOT" in node:
+        inner = _batch_fn(node["NOT"], atom_index)
+        return lambda X, R: ~np.asarray(inner(X, R), dtype=bool)
+
+    for op, reduce, combine, empty in (
+        ("AND", np.all, np.logical_and, True),
+        ("OR", np.any, np.logical_or, False),
+    ):
+        if op not in node:
+            continue
+        terms = node[op]
+        if not isinstance(terms, list):
+            raise ValueError(f"{op} expects a list.")
+        cols = np.array([atom_index[t] for t in terms if isinstance(t, str) and t in atom_index], dtype=np.intp)
+        rest = [_batch_fn(t, atom_index) for t in terms if not (isinstance(t, str) and t in atom_index)]
+
+        def fn(X, R, cols=cols, rest=rest, reduce=reduce, combine=combine, empty=empty):
+            out = reduce(X[cols], axis=0) if cols.size else empty
+            for f in rest:
+                out = combine(out, f(X, R))
+            return out
+        return fn
+
+    raise ValueError(f"Unknown expr form: {node!r}")